@@ -0,0 +1,95 @@
+"""In-process API for juq's notebook transforms, e.g. for embedding in long-running services.
+
+Each function accepts a notebook as a ``dict``, or as (optionally gzip/zstd-compressed) JSON ``str``/``bytes``, and
+returns the serialized result, identical to what the corresponding CLI command writes to stdout. Formatting (indent,
+trailing newline) is inferred from JSON input like the CLI does; ``dict`` input defaults to ``indent=1`` with a
+trailing newline. Inputs are never mutated, and no global state is touched, so these are safe to call concurrently
+from multiple threads.
+"""
+from __future__ import annotations
+
+import json
+from copy import deepcopy
+from io import BytesIO
+from typing import Callable, Union
+
+from juq.cells import dumps_cells, slice_cells
+from juq.fmt import fmt as _fmt
+from juq.io import compressed_file, dumps_nb, infer_nb_indent, infer_nb_trailing_newline, sniff_compression
+from juq.merge_outputs import merge_outputs as _merge_outputs
+from juq.papermill.clean import papermill_clean
+from juq.renumber import renumber as _renumber
+
+Nb = Union[dict, str, bytes]
+
+
+def load(nb: Nb) -> tuple[dict, int | None, bool]:
+    """Parse a notebook (or deep-copy a ``dict``); return it with the indent and trailing newline the CLI would use."""
+    if isinstance(nb, dict):
+        return deepcopy(nb), 1, True
+    if isinstance(nb, (bytes, bytearray, memoryview)):
+        nb = bytes(nb)
+        compression = sniff_compression(nb[:4])
+        if compression:
+            with compressed_file(BytesIO(nb), 'rb', compression) as f:
+                nb = f.read()
+        nb = nb.decode('utf-8')
+    return json.loads(nb), infer_nb_indent(nb), infer_nb_trailing_newline(nb)
+
+
+def apply(
+    transform: Callable[..., dict],
+    nb: Nb,
+    *,
+    indent: int | None = None,
+    ensure_ascii: bool = False,
+    trailing_newline: bool | None = None,
+    **kwargs,
+) -> str:
+    """Apply a ``transform(nb, **kwargs) -> nb`` function to a notebook, and serialize the result."""
+    nb, inferred_indent, inferred_trailing_newline = load(nb)
+    nb = transform(nb, **kwargs)
+    return dumps_nb(
+        nb,
+        indent=inferred_indent if indent is None else indent,
+        ensure_ascii=ensure_ascii,
+        trailing_newline=inferred_trailing_newline if trailing_newline is None else trailing_newline,
+    )
+
+
+def fmt(nb: Nb, **kwargs) -> str:
+    """Reformat/filter a notebook (`juq nb fmt`); see :func:`juq.fmt.fmt` for filter kwargs."""
+    return apply(_fmt, nb, **kwargs)
+
+
+def clean(nb: Nb, keep_ids: bool = True, keep_tags: bool | None = None, **kwargs) -> str:
+    """Remove Papermill metadata from a notebook (`juq nb clean`); ``keep_tags=None`` (the CLI default) leaves empty
+    ``tags`` arrays as-is."""
+    return apply(papermill_clean, nb, keep_ids=keep_ids, keep_tags=keep_tags, **kwargs)
+
+
+def merge_outputs(nb: Nb, **kwargs) -> str:
+    """Merge consecutive "stream" outputs (`juq merge-outputs`)."""
+    return apply(_merge_outputs, nb, **kwargs)
+
+
+def renumber(nb: Nb, **kwargs) -> str:
+    """Renumber ``execution_count``s from 1 (`juq renumber`), without logging each change to stderr."""
+    return apply(_renumber, nb, quiet=True, **kwargs)
+
+
+def cells(
+    nb: Nb,
+    cells_slice: str,
+    *,
+    cell_type: str | None = None,
+    metadata: bool | None = None,
+    outputs: bool | None = None,
+    source: bool | None = None,
+) -> str:
+    """Slice/filter cells (`juq cells`); ``cells_slice`` may be a comma-separated list of slices."""
+    nb, _, _ = load(nb)
+    return ''.join(
+        dumps_cells(slice_cells(nb, slice_str, cell_type=cell_type, metadata=metadata, outputs=outputs, source=source))
+        for slice_str in cells_slice.split(',')
+    )
@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+import json
+from hashlib import sha256
+from os import makedirs, replace
+from os.path import exists, join
+from tempfile import NamedTemporaryFile
+
+from juq.budget import TEXT_MIMETYPE
+
+# Externalized string (or multiline-string list) values are replaced by a string reference, and JSON-valued
+# mimebundle entries (e.g. "application/json") by an object reference, so that notebooks remain schema-valid.
+BLOB_PREFIX = 'juq-blob:sha256:'
+BLOB_KEY = 'juq-blob'
+
+
+def blob_path(store: str, digest: str) -> str:
+    return join(store, digest[:2], digest[2:])
+
+
+def write_blob(store: str, digest: str, content: bytes):
+    """Write ``content`` to ``store``, under the key ``digest``."""
+    blob_dir = join(store, digest[:2])
+    makedirs(blob_dir, exist_ok=True)
+    # Write atomically, in case of concurrent writers (e.g. several notebooks with the same plot)
+    with NamedTemporaryFile('wb', dir=blob_dir, delete=False) as f:
+        f.write(content)
+    replace(f.name, blob_path(store, digest))
+
+
+def put_blob(store: str, content: bytes) -> str:
+    """Write ``content`` to the content-addressed ``store`` directory (if not already present), return its SHA-256."""
+    digest = sha256(content).hexdigest()
+    if not exists(blob_path(store, digest)):
+        write_blob(store, digest, content)
+    return digest
+
+
+def get_blob(store: str, digest: str) -> bytes:
+    path = blob_path(store, digest)
+    if not exists(path):
+        raise FileNotFoundError(f"Blob {digest} not found in store {store}")
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def blob_ref(value) -> str | None:
+    """Return the digest referenced by ``value``, if it is an externalized-blob reference."""
+    if isinstance(value, str) and value.startswith(BLOB_PREFIX):
+        return value[len(BLOB_PREFIX):]
+    if isinstance(value, dict) and len(value) == 1 and BLOB_KEY in value:
+        ref = value[BLOB_KEY]
+        if isinstance(ref, str) and ref.startswith('sha256:'):
+            return ref[len('sha256:'):]
+    return None
+
+
+def externalize_value(value, store: str, min_bytes: int):
+    """Move a mimebundle value of at least ``min_bytes`` (as JSON) into ``store``, and return a reference to it.
+
+    The blob holds the value's JSON encoding, so that rehydration restores it exactly (including e.g. line-wrapped
+    base64, or list-of-lines form).
+    """
+    if blob_ref(value) is not None:
+        return value
+    content = json.dumps(value, ensure_ascii=False).encode('utf-8')
+    if len(content) < min_bytes:
+        return value
+    digest = put_blob(store, content)
+    return {BLOB_KEY: f'sha256:{digest}'} if isinstance(value, dict) else f'{BLOB_PREFIX}{digest}'
+
+
+def rehydrate_value(value, store: str):
+    digest = blob_ref(value)
+    if digest is None:
+        return value
+    return json.loads(get_blob(store, digest))
+
+
+def mimebundles(nb: dict):
+    """Yield each mimebundle in a notebook that may be (de)externalized: rich output data, and cell attachments."""
+    for cell in nb['cells']:
+        for output in cell.get('outputs', []):
+            if 'data' in output:
+                yield output['data']
+        for attachment in cell.get('attachments', {}).values():
+            yield attachment
+
+
+def externalize(nb: dict, store: str, min_bytes: int = 4096) -> dict:
+    """Replace large output payloads and attachments (other than "text/plain") with references into ``store``."""
+    for bundle in mimebundles(nb):
+        for mimetype, value in bundle.items():
+            if mimetype != TEXT_MIMETYPE:
+                bundle[mimetype] = externalize_value(value, store, min_bytes)
+    return nb
+
+
+def rehydrate(nb: dict, store: str) -> dict:
+    """Replace blob references (see :func:`externalize`) with their contents from ``store``."""
+    for bundle in mimebundles(nb):
+        for mimetype, value in bundle.items():
+            bundle[mimetype] = rehydrate_value(value, store)
+    return nb
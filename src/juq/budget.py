@@ -0,0 +1,176 @@
+from __future__ import annotations
+
+import json
+import re
+
+TRUNCATION_MARKER = '\n[… juq: truncated {} bytes …]\n'
+PLACEHOLDER = '[juq: dropped {} output ({} bytes)]'
+TEXT_MIMETYPE = 'text/plain'
+OVERSIZE_MODES = ('placeholder', 'drop')
+TRUNCATION_RGX = re.compile(r'\n\[… juq: truncated \d+ bytes …\]\n')
+PLACEHOLDER_RGX = re.compile(r'\[juq: dropped .+ output \(\d+ bytes\)\]')
+
+
+def utf8_len(s: str) -> int:
+    return len(s.encode('utf-8'))
+
+
+def json_size(obj) -> int:
+    """Size of an output (or other JSON value), as compact UTF-8 JSON."""
+    return utf8_len(json.dumps(obj, ensure_ascii=False, separators=(',', ':')))
+
+
+def join_text(text: str | list[str]) -> str:
+    return ''.join(text) if isinstance(text, list) else text
+
+
+def truncate_text(text: str, max_bytes: int) -> str | None:
+    """Truncate ``text`` to at most ``max_bytes`` (UTF-8), keeping its head and tail, joined by a marker; return None if
+    ``max_bytes`` can't hold the marker.
+
+    The head and tail are cut at line boundaries where possible (so that e.g. log lines stay intact).
+    """
+    data = text.encode('utf-8')
+    if len(data) <= max_bytes:
+        return text
+    half = (max_bytes - utf8_len(TRUNCATION_MARKER.format(len(data)))) // 2
+    if half < 0:
+        return None
+    head = data[:half]
+    tail = data[len(data) - half:] if half else b''
+    if b'\n' in head:
+        head = head[:head.rindex(b'\n') + 1]
+    if b'\n' in tail[:-1]:
+        tail = tail[tail.index(b'\n') + 1:]
+    head = head.decode('utf-8', 'ignore')
+    tail = tail.decode('utf-8', 'ignore')
+    num_truncated = len(data) - utf8_len(head) - utf8_len(tail)
+    return head.rstrip('\n') + TRUNCATION_MARKER.format(num_truncated) + tail
+
+
+def truncate_json_text(text: str, max_bytes: int) -> str | None:
+    """Truncate ``text`` so that its JSON encoding (without quotes) is at most ``max_bytes`` (escapes like "\\n" take 2
+    bytes); return None if ``max_bytes`` can't hold the truncation marker."""
+    raw_size = utf8_len(text)
+    encoded_size = json_size(text) - 2
+    if encoded_size <= max_bytes:
+        return text
+    if max_bytes < 0:
+        return None
+    raw_max = max_bytes * raw_size // encoded_size
+    while True:
+        truncated = truncate_text(text, raw_max)
+        if truncated is None:
+            return None
+        excess = json_size(truncated) - 2 - max_bytes
+        if excess <= 0:
+            return truncated
+        raw_max -= excess
+
+
+def output_text(output: dict) -> str | None:
+    """An output's "stream" text or "text/plain" data, if any."""
+    if output.get('output_type') == 'stream':
+        return join_text(output.get('text', ''))
+    text = output.get('data', {}).get(TEXT_MIMETYPE)
+    return None if text is None else join_text(text)
+
+
+def placeholder(output: dict, size: int, oversize: str, kinds: str) -> dict | None:
+    """Replace an oversized output with a placeholder (``oversize="placeholder"``), or drop it (``oversize="drop"``)."""
+    if oversize == 'drop':
+        return None
+    text = PLACEHOLDER.format(kinds, size)
+    if output.get('output_type') == 'stream':
+        return {**output, 'text': text}
+    data = output.get('data', {})
+    metadata = output.get('metadata')
+    output = {**output, 'data': {TEXT_MIMETYPE: text}}
+    if metadata:
+        output['metadata'] = {k: v for k, v in metadata.items() if k not in data or k == TEXT_MIMETYPE}
+    return output
+
+
+def fit_output(output: dict, max_bytes: int, oversize: str = 'placeholder') -> dict | None:
+    """Shrink an output to at most ``max_bytes``, or return None if it should be dropped.
+
+    "stream" text (and "text/plain" data) is truncated (see :func:`truncate_text`). Oversized "rich" outputs
+    (``display_data``/``execute_result`` with non-"text/plain" data) lose their rich representations, keeping their
+    (possibly truncated) "text/plain" one. Outputs that still don't fit (e.g. rich ones with no "text/plain" data, or
+    when ``max_bytes`` can't hold a truncation marker) are replaced by a placeholder (``oversize="placeholder"``), or
+    dropped entirely (``oversize="drop"``).
+
+    Outputs that were already truncated are never truncated again (they're kept if they fit, and replaced or dropped
+    otherwise), and placeholders are kept as-is, so that applying a budget twice is the same as applying it once.
+    """
+    size = json_size(output)
+    if size <= max_bytes:
+        return output
+    output_type = output.get('output_type')
+    if output_type not in ('stream', 'display_data', 'execute_result'):
+        # e.g. "error" outputs are left as-is
+        return output
+    text = output_text(output)
+    if text is not None and PLACEHOLDER_RGX.fullmatch(text):
+        # Placeholders are small, and never truncated
+        return output
+    if output_type == 'stream':
+        kinds = output.get('name', 'stream')
+        if not TRUNCATION_RGX.search(text):
+            overhead = json_size({**output, 'text': ''})
+            truncated = truncate_json_text(text, max_bytes - overhead)
+            if truncated is not None:
+                return {**output, 'text': truncated}
+        return placeholder(output, size, oversize, kinds)
+    data = output.get('data', {})
+    rich = [mimetype for mimetype in data if mimetype != TEXT_MIMETYPE]
+    kinds = ', '.join(rich) or TEXT_MIMETYPE
+    if text is None:
+        return placeholder(output, size, oversize, kinds)
+    output = {**output, 'data': {TEXT_MIMETYPE: data[TEXT_MIMETYPE]}}
+    metadata = output.get('metadata')
+    if metadata:
+        output['metadata'] = {k: v for k, v in metadata.items() if k not in rich}
+    if json_size(output) <= max_bytes:
+        return output
+    if not TRUNCATION_RGX.search(text):
+        overhead = json_size({**output, 'data': {TEXT_MIMETYPE: ''}})
+        truncated = truncate_json_text(text, max_bytes - overhead)
+        if truncated is not None:
+            return {**output, 'data': {TEXT_MIMETYPE: truncated}}
+    return placeholder(output, size, oversize, kinds)
+
+
+def budget_outputs(
+    nb: dict,
+    max_output_bytes: int | None = None,
+    max_cell_bytes: int | None = None,
+    max_nb_bytes: int | None = None,
+    oversize: str = 'placeholder',
+) -> dict:
+    """Bound the size of each output, of each cell's outputs, and of all of a notebook's outputs (see :func:`fit_output`).
+
+    Outputs are processed in order; once a cell's (or the notebook's) budget is used up, later outputs are truncated or
+    replaced by placeholders.
+    """
+    if max_output_bytes is None and max_cell_bytes is None and max_nb_bytes is None:
+        return nb
+    nb_remaining = max_nb_bytes
+    for cell in nb['cells']:
+        if 'outputs' not in cell:
+            continue
+        cell_remaining = max_cell_bytes
+        outputs = []
+        for output in cell['outputs']:
+            limits = [ n for n in (max_output_bytes, cell_remaining, nb_remaining) if n is not None ]
+            output = fit_output(output, max(min(limits), 0), oversize=oversize)
+            if output is None:
+                continue
+            outputs.append(output)
+            size = json_size(output)
+            if cell_remaining is not None:
+                cell_remaining -= size
+            if nb_remaining is not None:
+                nb_remaining -= size
+        cell['outputs'] = outputs
+    return nb
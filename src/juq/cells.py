@@ -1,8 +1,14 @@
+from __future__ import annotations
+
 import json
+from os import makedirs
+from os.path import dirname, join
+from string import Formatter
+from sys import stdout
 
 from click import argument, option
 
-from juq.cli import with_nb_input, cli
+from juq.cli import cli, stream_opt, with_nb_input
 
 CELL_TYPE_ABBREVS = {
     'c': 'code',
@@ -10,17 +16,22 @@ CELL_TYPE_ABBREVS = {
     'md': 'markdown',
     'r': 'raw',
 }
+SPLIT_TEMPLATE = '{slice}.{ext}'
 
 
-@cli.command
-@option('-m/-M', '--metadata/--no-metadata', default=None, help='Explicitly include or exclude each cell\'s "metadata" key. If only `-m` is passed, only the "metadata" value of each cell is printed')
-@option('-o/-O', '--outputs/--no-outputs', default=None, help='Explicitly include or exclude each cell\'s "outputs" key. If only `-o` is passed, only the "outputs" value of each cell is printed')
-@option('-s/-S', '--source/--no-source', default=None, help='Explicitly include or exclude each cell\'s "source" key. If only `-s` is passed, the source is printed directly (not as JSON)')
-@option('-t', '--cell-type', help='Only print cells of this type. Recognizes abbreviations: "c" for "code", {"m","md"} for "markdown", "r" for "raw"')
-@argument('cells_slice')
-@with_nb_input
-def cells(cell_type, cells_slice, nb, **flags):
-    """Slice/Filter cells."""
+def parse_cells_slice(cells_slice: str) -> int | slice:
+    """Parse a cell index (e.g. "3", "-1") or Python-style range of cells (e.g. "2:5", "-3:")."""
+    pcs = cells_slice.split(':')
+    if len(pcs) == 1:
+        return int(pcs[0])
+    elif len(pcs) == 2:
+        return slice(*map(lambda x: int(x.strip()) if x.strip() else None, pcs))
+    else:
+        raise ValueError(f"Unrecognized <cells slice>: {cells_slice}")
+
+
+def filter_cells(nb: dict, cell_type: str | None = None) -> list[dict]:
+    """A notebook's cells, optionally only those of one ``cell_type`` (or its abbreviation, e.g. "c", "md")."""
     cells = nb['cells']
     if cell_type:
         if cell_type in CELL_TYPE_ABBREVS:
@@ -30,6 +41,23 @@ def cells(cell_type, cells_slice, nb, **flags):
             for cell in cells
             if cell['cell_type'] == cell_type
         ]
+    return cells
+
+
+def slice_cells(
+    nb: dict,
+    cells_slice: str,
+    cell_type: str | None = None,
+    metadata: bool | None = None,
+    outputs: bool | None = None,
+    source: bool | None = None,
+):
+    """Select a cell (e.g. "3") or range of cells (e.g. "2:5") from a notebook, optionally filtering their fields.
+
+    Returns a cell's source string (if only ``source`` is set), or otherwise a JSON-serializable value.
+    """
+    flags = dict(metadata=metadata, outputs=outputs, source=source)
+    cells = filter_cells(nb, cell_type)
 
     def slice_cell(cell):
         num_flags = sum(1 if v else 0 for v in flags.values())
@@ -54,22 +82,76 @@ def cells(cell_type, cells_slice, nb, **flags):
                 if flags.get(k)is not False
             }
 
-    pcs = cells_slice.split(':')
-    if len(pcs) == 1:
-        cell = cells[int(pcs[0])]
-        cell = slice_cell(cell)
-        obj = cell
-    elif len(pcs) == 2:
-        cells = cells[slice(*map(lambda x: int(x.strip()) if x.strip() else None, pcs))]
-        cells = [
+    idx = parse_cells_slice(cells_slice)
+    if isinstance(idx, int):
+        return slice_cell(cells[idx])
+    else:
+        return [
             slice_cell(cell)
-            for cell in cells
+            for cell in cells[idx]
         ]
-        obj = cells
-    else:
-        raise ValueError(f"Unrecognized <cells slice>: {cells_slice}")
 
+
+def dumps_cells(obj) -> str:
+    """Render :func:`slice_cells` output the way `juq cells` prints it (source strings as-is, else indented JSON)."""
     if isinstance(obj, str):
-        print(obj)
+        return obj + '\n'
     else:
-        print(json.dumps(obj, indent=2))
+        return json.dumps(obj, indent=2) + '\n'
+
+
+def cells_ext(nb: dict, obj, cell: dict) -> str:
+    """File extension for a slice's :func:`dumps_cells` output: "json", unless ``obj`` is a single ``cell``'s source
+    ("md" for markdown, the notebook language's extension (e.g. "py") for code, else "txt")."""
+    if not isinstance(obj, str):
+        return 'json'
+    if cell['cell_type'] == 'markdown':
+        return 'md'
+    if cell['cell_type'] == 'code':
+        ext = nb.get('metadata', {}).get('language_info', {}).get('file_extension')
+        if ext:
+            return ext.lstrip('.')
+    return 'txt'
+
+
+def split_path(split_to: str, idx: int, cells_slice: str, ext: str) -> str:
+    """Path to write the ``idx``-th slice to: ``split_to`` is a directory, or a template with {i}, {slice}, {ext} fields.
+
+    Within {slice}, ":" is replaced by "-" (e.g. "2:5" → "2-5").
+    """
+    template = split_to if '{' in split_to else join(split_to, SPLIT_TEMPLATE)
+    return template.format(i=idx, slice=cells_slice.replace(':', '-'), ext=ext)
+
+
+@cli.command
+@option('-d', '--split-to', help=f'Write each of several comma-separated slices to its own file: a directory (files named "{SPLIT_TEMPLATE}"), or a path template with {{i}} (slice index), {{slice}} (e.g. "2-5" for "2:5"), and {{ext}} (e.g. "py", "md", "json") fields ({{i}} or {{slice}} is required for several slices). Not supported with --stream')
+@option('-m/-M', '--metadata/--no-metadata', default=None, help='Explicitly include or exclude each cell\'s "metadata" key. If only `-m` is passed, only the "metadata" value of each cell is printed')
+@option('-o/-O', '--outputs/--no-outputs', default=None, help='Explicitly include or exclude each cell\'s "outputs" key. If only `-o` is passed, only the "outputs" value of each cell is printed')
+@option('-s/-S', '--source/--no-source', default=None, help='Explicitly include or exclude each cell\'s "source" key. If only `-s` is passed, the source is printed directly (not as JSON)')
+@option('-t', '--cell-type', help='Only print cells of this type. Recognizes abbreviations: "c" for "code", {"m","md"} for "markdown", "r" for "raw"')
+@argument('cells_slice')
+@stream_opt
+@with_nb_input
+def cells(cell_type, cells_slice, nb, metadata=None, outputs=None, source=None, split_to=None):
+    """Slice/Filter cells.
+
+    CELLS_SLICE is a cell index (e.g. "3"), range (e.g. "2:5"), or comma-separated list of them (e.g. "0,2:5,-1"), which
+    are printed in turn (or written to separate files, with -d/--split-to).
+    """
+    slice_strs = cells_slice.split(',')
+    if split_to and '{' in split_to and len(slice_strs) > 1:
+        fields = { name for _, name, _, _ in Formatter().parse(split_to) if name }
+        if not fields & {'i', 'slice'}:
+            raise ValueError(f"-d/--split-to template {split_to!r} has no {{i}} or {{slice}} field, so {len(slice_strs)} slices would all be written to one file")
+    for idx, slice_str in enumerate(slice_strs):
+        obj = slice_cells(nb, slice_str, cell_type=cell_type, metadata=metadata, outputs=outputs, source=source)
+        if split_to:
+            cell = filter_cells(nb, cell_type)[parse_cells_slice(slice_str)] if isinstance(obj, str) else None
+            path = split_path(split_to, idx, slice_str, cells_ext(nb, obj, cell))
+            path_dir = dirname(path)
+            if path_dir:
+                makedirs(path_dir, exist_ok=True)
+            with open(path, 'w') as f:
+                f.write(dumps_cells(obj))
+        else:
+            stdout.write(dumps_cells(obj))
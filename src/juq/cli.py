@@ -1,40 +1,52 @@
 from __future__ import annotations
 
-import json
-from contextlib import nullcontext
+import sys
 from functools import wraps
 from inspect import getfullargspec
 from os.path import exists
-from sys import stdin, stdout
 
-from click import argument, group, option, pass_context
-from utz import recvs, call
+from click import Choice, argument, group, option, pass_context
+from utz import recvs, call, err
 
+from juq import timing
+from juq.io import (
+    COMPRESSIONS,
+    dump_nb,
+    dumps_nb,
+    infer_compression,
+    infer_nb_indent,
+    infer_nb_trailing_newline,
+    iter_nbs,
+    load_nb,
+    open_nb_out,
+    read_nb_ends,
+    read_nb_str,
+)
 
-@group()
-def cli():
-    pass
 
+@group()
+@option('--profile', 'profile_path', envvar='JUQ_PROFILE', help='Dump cProfile stats (pstats format) for the command to this path (env: $JUQ_PROFILE)')
+@option('--timings', is_flag=True, envvar='JUQ_TIMINGS', help='Log time spent importing, reading, parsing, transforming, serializing ("parallel" with -j/--jobs, where worker processes do all three), and writing, and peak RSS, to stderr (env: $JUQ_TIMINGS)')
+@pass_context
+def cli(ctx, profile_path, timings):
+    if profile_path:
+        from cProfile import Profile
+        profile = Profile()
 
-def infer_nb_indent(nb_str: str) -> int | None:
-    """Infer indentation level from notebook JSON string."""
-    if nb_str.startswith('{'):
-        if len(nb_str) > 1 and nb_str[1] == "\n":
-            idx = 2
-            indent = 0
-            while idx < len(nb_str) and nb_str[idx] == ' ':
-                idx += 1
-                indent += 1
-            return indent
-        else:
-            return None
-    else:
-        raise ValueError(f"Cannot infer `indent` from non-JSON input beginning with {nb_str[:30]}")
-
+        def dump_profile():
+            profile.disable()
+            profile.dump_stats(profile_path)
 
-def infer_nb_trailing_newline(nb_str: str) -> bool:
-    """Infer whether notebook string has trailing newline."""
-    return nb_str.endswith('\n')
+        ctx.call_on_close(dump_profile)
+        profile.enable()
+    if timings:
+        timing.enable()
+        # Label the report with the subcommand and its args (omitting global options like --timings)
+        args = sys.argv[1:]
+        if ctx.invoked_subcommand in args:
+            args = args[args.index(ctx.invoked_subcommand):]
+        label = ' '.join(['juq', *args])
+        ctx.call_on_close(lambda: timing.report(label))
 
 
 def write_nb(
@@ -43,33 +55,107 @@ def write_nb(
     indent: int | None = None,
     ensure_ascii: bool = False,
     trailing_newline: bool | None = None,
-):
-    """Write a notebook dict to a file.
+    compression: str | None = None,
+    if_changed: bool = False,
+) -> bool:
+    """Write a notebook dict to a file; return whether it was written.
 
     If indent is None and the file exists, infer indent from existing file.
     If trailing_newline is None and the file exists, infer from existing file.
+    If compression is None, infer it from the path's extension (``.gz``: gzip, ``.zst``: zstd).
+    If if_changed is True, leave the file untouched (incl. its mtime) if its contents would be unchanged.
     """
+    if compression is None:
+        compression = infer_compression(path)
+    elif compression == 'none':
+        compression = None
     if (indent is None or trailing_newline is None) and exists(path):
-        with open(path) as f:
-            existing = f.read()
+        with timing.phase('read'):
+            head, tail = read_nb_ends(path)
         if indent is None:
-            indent = infer_nb_indent(existing)
+            indent = infer_nb_indent(head)
             if indent is None:
                 indent = 1
         if trailing_newline is None:
-            trailing_newline = infer_nb_trailing_newline(existing)
+            trailing_newline = infer_nb_trailing_newline(tail)
     else:
         if indent is None:
             indent = 1
         if trailing_newline is None:
             trailing_newline = True
 
-    with open(path, 'w') as f:
-        json.dump(nb, f, indent=indent, ensure_ascii=ensure_ascii)
+    if if_changed and exists(path):
+        nb_str = dumps_nb(nb, indent=indent, ensure_ascii=ensure_ascii, trailing_newline=trailing_newline)
+        with timing.phase('read'):
+            if read_nb_str(path) == nb_str:
+                return False
+        with open_nb_out(path, compression) as f:
+            f.write(nb_str)
+        return True
+
+    with open_nb_out(path, compression) as f:
+        dump_nb(nb, f, indent=indent, ensure_ascii=ensure_ascii, trailing_newline=trailing_newline)
+    return True
+
+
+def output_nb(
+    nb: dict,
+    out_path: str | None,
+    indent: int | None = None,
+    ensure_ascii: bool = False,
+    trailing_newline: bool | None = None,
+    compression: str | None = None,
+    if_changed: bool = False,
+):
+    """Write a notebook dict to ``out_path`` (via :func:`write_nb`), or to stdout if ``out_path`` is empty or "-"."""
+    if out_path and out_path != '-':
+        write_nb(nb, out_path, indent=indent, ensure_ascii=ensure_ascii, trailing_newline=trailing_newline, compression=compression, if_changed=if_changed)
+    else:
+        with open_nb_out(None, None if compression == 'none' else compression) as f:
+            dump_nb(nb, f, indent=indent, ensure_ascii=ensure_ascii, trailing_newline=trailing_newline)
+
+
+def output_chunked(
+    func,
+    kwargs: dict,
+    chunks: list[bytes],
+    out_path: str | None,
+    jobs: int,
+    indent: int,
+    ensure_ascii: bool = False,
+    trailing_newline: bool = True,
+    compression: str | None = None,
+):
+    """Transform and serialize a chunked notebook's cells in a process pool (see :mod:`juq.parallel`), writing the
+    output to ``out_path`` (or stdout) as it's stitched together."""
+    from juq.parallel import iter_transformed
+    if out_path == '-':
+        out_path = None
+    if compression is None:
+        compression = infer_compression(out_path)
+    elif compression == 'none':
+        compression = None
+    with timing.phase('parallel'), open_nb_out(out_path, compression) as f:
+        for piece in iter_transformed(func, kwargs, chunks, jobs=jobs, indent=indent, ensure_ascii=ensure_ascii):
+            with timing.phase('write'):
+                f.write(piece)
         if trailing_newline:
             f.write('\n')
 
 
+def validate_out_nb(nb: dict):
+    from juq.validate import validate_nb
+    with timing.phase('validate'):
+        validate_nb(nb)
+
+
+stream_opt = option('--stream', is_flag=True, help='Read a stream of notebooks from stdin (concatenated or newline-delimited JSON), and process/emit each one in turn')
+validate_opt = option('--validate', is_flag=True, envvar='JUQ_VALIDATE', help="Validate output notebooks against the nbformat schema, and fail (without writing) if they're invalid (env: $JUQ_VALIDATE)")
+watch_opt = option('--watch', 'watch_dir', metavar='DIR', help='Watch DIR for notebook writes, and rewrite each changed notebook in-place (only if the transform changes it); runs until interrupted')
+jobs_opt = option('-j', '--jobs', type=int, help='Parse, transform, and serialize chunks of cells in this many processes (for large notebooks; requires indented JSON input, otherwise processed serially)')
+compression_opt = option('-z', '--compression', type=Choice([*COMPRESSIONS, 'none']), help='Compress output JSON (default: infer from output path extension, e.g. ".ipynb.gz", ".ipynb.zst")')
+
+
 def with_nb_input(func):
     spec = getfullargspec(func)
 
@@ -87,26 +173,64 @@ def with_nb_input(func):
             raise ValueError(f"Specify -o/--out-path xor a 2nd positional arg, not both: {out_path_arg} != {out_path_opt}")
         out_path = out_path_arg or out_path_opt
 
-        ctx = nullcontext(stdin) if nb_path == '-' or nb_path is None else open(nb_path, 'r')
-        with ctx as f:
-            nb_str = f.read()
-            indent = kwargs.pop('indent', None)
-            if indent is None:
-                indent = infer_nb_indent(nb_str)
-
-            trailing_newline = kwargs.pop('trailing_newline', None)
-            if trailing_newline is None:
-                trailing_newline = infer_nb_trailing_newline(nb_str)
-            nb = json.loads(nb_str)
-        return call(
-            func,
-            **kwargs,
-            nb_path=nb_path,
-            out_path=out_path,
-            nb=nb,
-            indent=indent,
-            trailing_newline=trailing_newline,
-        )
+        indent = kwargs.pop('indent', None)
+        trailing_newline = kwargs.pop('trailing_newline', None)
+
+        def call_nb(nb, head, tail, nb_path=nb_path, out_path=out_path, **extra):
+            return call(
+                func,
+                **kwargs,
+                **extra,
+                nb_path=nb_path,
+                out_path=out_path,
+                nb=nb,
+                indent=infer_nb_indent(head) if indent is None else indent,
+                trailing_newline=infer_nb_trailing_newline(tail) if trailing_newline is None else trailing_newline,
+            )
+
+        jobs = kwargs.get('jobs')
+        watch_dir = kwargs.pop('watch_dir', None)
+        if jobs and jobs > 1 and (watch_dir or kwargs.get('stream')):
+            raise ValueError("-j/--jobs is not supported with --watch or --stream")
+        if kwargs.get('split_to') and kwargs.get('stream'):
+            # Every notebook in the stream would write (and overwrite) the same files
+            raise ValueError("-d/--split-to is not supported with --stream")
+        if watch_dir:
+            if nb_path or out_path:
+                raise ValueError("--watch rewrites changed notebooks in-place; don't pass [NB_PATH]/[OUT_PATH]")
+            if kwargs.get('stream'):
+                raise ValueError("Pass --watch xor --stream, not both")
+            kwargs.pop('in_place', None)
+            from juq.watch import watch_nbs
+            err(f"Watching {watch_dir} for notebook changes")
+            for paths in watch_nbs(watch_dir):
+                for path in paths:
+                    # Our own writes trigger another event, but re-applying the transform is then a no-op (which
+                    # isn't written)
+                    try:
+                        nb, head, tail = load_nb(path)
+                        call_nb(nb, head, tail, nb_path=path, out_path=None, in_place=True, if_changed=True)
+                    except FileNotFoundError:
+                        continue
+                    except Exception as e:
+                        err(f"{path}: {type(e).__name__}: {e}")
+        elif kwargs.pop('stream', False):
+            if nb_path and nb_path != '-':
+                raise ValueError("--stream reads notebooks from stdin; don't pass [NB_PATH]")
+            if out_path and out_path != '-':
+                raise ValueError("--stream writes notebooks to stdout; don't pass [OUT_PATH]/-o/--out-path")
+            if not recvs(func, 'nb'):
+                raise ValueError("--stream is only supported by commands that transform notebook contents")
+            for nb, head, tail in iter_nbs(nb_path):
+                call_nb(nb, head, tail)
+                sys.stdout.flush()
+        elif jobs and jobs > 1:
+            from juq.parallel import load_chunked
+            nb, head, tail, chunks = load_chunked(nb_path, jobs)
+            return call_nb(nb, head, tail, chunks=chunks)
+        else:
+            nb, head, tail = load_nb(nb_path)
+            return call_nb(nb, head, tail)
     return wrapper
 
 
@@ -116,6 +240,8 @@ def with_nb(func):
     @option('-n', '--indent', type=int, help='Indentation level for the output notebook JSON (default: infer from input)')
     @option('-o', '--out-path', help='Write to this file instead of stdout')
     @option('-t/-T', '--trailing-newline/--no-trailing-newline', default=None, help='Enforce presence or absence of a trailing newline (default: match input)')
+    @compression_opt
+    @validate_opt
     @with_nb_input
     @wraps(func)
     def wrapper(
@@ -126,6 +252,11 @@ def with_nb(func):
         in_place: bool = False,
         indent: int | None = None,
         trailing_newline: bool | None = None,
+        compression: str | None = None,
+        if_changed: bool = False,
+        validate: bool = False,
+        jobs: int | None = None,
+        chunks: list[bytes] | None = None,
         **kwargs,
     ):
         """Merge consecutive "stream" outputs (e.g. stderr)."""
@@ -138,7 +269,13 @@ def with_nb(func):
 
         kwargs['nb_path'] = nb_path
         kwargs['out_path'] = out_path
-        rv = call(func, *args, **kwargs)
+        if chunks is not None:
+            if validate:
+                raise ValueError("--validate is not supported with -j/--jobs")
+            output_chunked(func, kwargs, chunks, out_path, jobs=jobs, indent=indent, ensure_ascii=ensure_ascii, trailing_newline=trailing_newline, compression=compression)
+            return
+        with timing.phase('transform'):
+            rv = call(func, *args, **kwargs)
         if isinstance(rv, tuple):
             nb, exc = rv
         elif isinstance(rv, dict):
@@ -147,12 +284,9 @@ def with_nb(func):
         else:
             raise ValueError(f"Unrecognized with_nb return value {type(rv)}: {str(rv)[:100]}")
 
-        if out_path and out_path != '-':
-            write_nb(nb, out_path, indent=indent, ensure_ascii=ensure_ascii, trailing_newline=trailing_newline)
-        else:
-            json.dump(nb, stdout, indent=indent, ensure_ascii=ensure_ascii)
-            if trailing_newline:
-                print()
+        if validate:
+            validate_out_nb(nb)
+        output_nb(nb, out_path, indent=indent, ensure_ascii=ensure_ascii, trailing_newline=trailing_newline, compression=compression, if_changed=if_changed)
 
         if exc:
             raise exc
@@ -1,11 +1,13 @@
-import json
 from functools import wraps
-from sys import stdout
 
-from click import option
+from click import Choice, option
 from utz import decos, call
+from utz.cli import num
 
-from juq.cli import with_nb_input, write_nb, nb
+from juq import timing
+from juq.blobs import externalize, rehydrate
+from juq.budget import OVERSIZE_MODES, budget_outputs
+from juq.cli import compression_opt, jobs_opt, nb, output_chunked, output_nb, stream_opt, validate_opt, validate_out_nb, watch_opt, with_nb_input
 
 
 def filter_cell(cell, *, sources=True, outputs=True, metadata=True, execution_count=True, cell_id=True, attachments=True):
@@ -35,13 +37,33 @@ def fmt(
     cell_id=None,
     attachments=None,
     nb_metadata=None,
+    max_output_size=None,
+    max_cell_output_size=None,
+    max_nb_output_size=None,
+    oversize='placeholder',
+    externalize_dir=None,
+    blob_min_size=4096,
+    rehydrate_dir=None,
+    optimize_images=False,
+    image_cache=None,
 ):
-    """Reformat notebook JSON (adjust indent, trailing newline, filter fields).
+    """Reformat notebook JSON (adjust indent, trailing newline, filter fields, bound output sizes).
 
     Filter flags:
       lowercase (-s, -o, -a, -b, -c, -i, -m) = keep ONLY this field
       uppercase (-S, -O, -A, -B, -C, -I, -M) = DROP this field
+
+    Output size budgets (--max-*-size) truncate "stream" and "text/plain" outputs (keeping their head and tail), and
+    replace (or drop) oversized rich outputs (images, HTML, etc.).
+
+    --externalize moves large output payloads and attachments into a content-addressed blob store, replacing them with
+    hash references; --rehydrate restores them.
+
+    --optimize-images losslessly recompresses PNG outputs and attachments (keeping them only if smaller).
     """
+    if rehydrate_dir:
+        nb = rehydrate(nb, rehydrate_dir)
+
     # Check for "only" mode: if exactly one field is explicitly True, keep only that
     explicit_true = [
         ('sources', sources),
@@ -91,6 +113,19 @@ def fmt(
     if not keep_nb_metadata:
         nb['metadata'] = {}
 
+    if optimize_images:
+        from juq import images
+        nb = images.optimize_images(nb, cache=image_cache or images.default_image_cache())
+
+    nb = budget_outputs(
+        nb,
+        max_output_bytes=max_output_size,
+        max_cell_bytes=max_cell_output_size,
+        max_nb_bytes=max_nb_output_size,
+        oversize=oversize,
+    )
+    if externalize_dir:
+        nb = externalize(nb, externalize_dir, min_bytes=blob_min_size)
     return nb
 
 
@@ -101,6 +136,11 @@ def _with_nb_fmt(func):
     @option('-n', '--indent', type=int, help='Indentation level for output JSON (default: infer from input)')
     @option('--out-path', help='Write to this file instead of stdout')
     @option('-t/-T', '--trailing-newline/--no-trailing-newline', default=None, help='Trailing newline (default: match input)')
+    @compression_opt
+    @jobs_opt
+    @stream_opt
+    @validate_opt
+    @watch_opt
     @with_nb_input
     @wraps(func)
     def wrapper(
@@ -111,6 +151,11 @@ def _with_nb_fmt(func):
         in_place: bool = False,
         indent: int | None = None,
         trailing_newline: bool | None = None,
+        compression: str | None = None,
+        if_changed: bool = False,
+        validate: bool = False,
+        jobs: int | None = None,
+        chunks: list[bytes] | None = None,
         **kwargs,
     ):
         if in_place:
@@ -122,16 +167,22 @@ def _with_nb_fmt(func):
 
         kwargs['nb_path'] = nb_path
         kwargs['out_path'] = out_path
-        rv = call(func, *args, **kwargs)
+        if chunks is not None:
+            if validate:
+                raise ValueError("--validate is not supported with -j/--jobs")
+            if kwargs.get('max_nb_output_size') is not None:
+                # Each process only sees some of the cells
+                raise ValueError("--max-nb-output-size is not supported with -j/--jobs")
+            output_chunked(func, kwargs, chunks, out_path, jobs=jobs, indent=indent, ensure_ascii=ensure_ascii, trailing_newline=trailing_newline, compression=compression)
+            return
+        with timing.phase('transform'):
+            rv = call(func, *args, **kwargs)
         nb_out = rv[0] if isinstance(rv, tuple) else rv
         exc = rv[1] if isinstance(rv, tuple) else None
 
-        if out_path and out_path != '-':
-            write_nb(nb_out, out_path, indent=indent, ensure_ascii=ensure_ascii, trailing_newline=trailing_newline)
-        else:
-            json.dump(nb_out, stdout, indent=indent, ensure_ascii=ensure_ascii)
-            if trailing_newline:
-                print()
+        if validate:
+            validate_out_nb(nb_out)
+        output_nb(nb_out, out_path, indent=indent, ensure_ascii=ensure_ascii, trailing_newline=trailing_newline, compression=compression, if_changed=if_changed)
 
         if exc:
             raise exc
@@ -149,5 +200,14 @@ nb_fmt_cmd = decos(
     option('-m/-M', '--cell-metadata/--no-cell-metadata', default=None, help='Keep only/drop cell metadata'),
     option('-o/-O', '--outputs/--no-outputs', default=None, help='Keep only/drop cell outputs'),
     option('-s/-S', '--sources/--no-sources', default=None, help='Keep only/drop cell sources'),
+    num('--max-output-size', help='Max size (in bytes, e.g. "100k", "1Mi") of each output'),
+    num('--max-cell-output-size', help="Max total size of each cell's outputs"),
+    num('--max-nb-output-size', help="Max total size of the notebook's outputs"),
+    option('--oversize', type=Choice(OVERSIZE_MODES), default='placeholder', help='How to handle rich outputs (images, HTML, etc.) that exceed a size budget, and outputs too large to truncate within what\'s left of one: replace with a "text/plain" placeholder (default), or drop. Rich outputs\' "text/plain" representation is kept when present'),
+    option('-x', '--externalize', 'externalize_dir', help='Move output payloads and attachments (other than "text/plain") of at least --blob-min-size bytes into this content-addressed blob store directory, replacing them with hash references'),
+    num('--blob-min-size', default=4096, help='Minimum size (in bytes, as JSON) of values to --externalize (default: 4096)'),
+    option('-X', '--rehydrate', 'rehydrate_dir', help='Restore --externalize\'d values from this blob store directory'),
+    option('--optimize-images', is_flag=True, help='Losslessly recompress "image/png" outputs and attachments (in parallel), keeping them if smaller'),
+    option('--image-cache', metavar='DIR', envvar='JUQ_IMAGE_CACHE', help='Cache --optimize-images results in this directory, keyed by image hash (default: $XDG_CACHE_HOME/juq/png; env: $JUQ_IMAGE_CACHE)'),
     _with_nb_fmt,
 )(fmt)
@@ -0,0 +1,151 @@
+"""Lossless recompression of PNG outputs and attachments (``juq nb fmt --optimize-images``).
+
+Plotting libraries typically write PNGs with a fast zlib setting (e.g. matplotlib uses level 6), and split the image
+data over several "IDAT" chunks. Here, the image data is decompressed and recompressed (as one "IDAT" chunk) with
+slower, stronger zlib settings; the (filtered) scanlines, and so the pixels, are unchanged, as are all other chunks.
+"""
+from __future__ import annotations
+
+import os
+import zlib
+from base64 import b64decode, b64encode
+from binascii import Error as Base64Error
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import sha256
+from os.path import exists, expanduser, join
+
+from juq.blobs import blob_path, blob_ref, mimebundles, write_blob
+
+PNG_MIMETYPE = 'image/png'
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+# (level, memLevel, strategy) combinations to try; the smallest result wins
+ZLIB_SETTINGS = [
+    (9, 9, zlib.Z_DEFAULT_STRATEGY),
+    (9, 9, zlib.Z_FILTERED),
+]
+
+
+def default_image_cache() -> str:
+    """Default cache directory for optimized images: ``$XDG_CACHE_HOME/juq/png`` (or ``~/.cache/juq/png``)."""
+    return join(os.environ.get('XDG_CACHE_HOME') or expanduser('~/.cache'), 'juq', 'png')
+
+
+def png_chunks(data: bytes) -> list[tuple[bytes, bytes]]:
+    """Parse a PNG into its ``(type, data)`` chunks; raise ValueError if it's malformed (e.g. a CRC mismatch)."""
+    if not data.startswith(PNG_SIGNATURE):
+        raise ValueError("Not a PNG")
+    chunks = []
+    pos = len(PNG_SIGNATURE)
+    while pos < len(data):
+        length = int.from_bytes(data[pos:pos + 4], 'big')
+        body = data[pos + 4:pos + 8 + length]
+        crc = data[pos + 8 + length:pos + 12 + length]
+        if len(body) != 4 + length or len(crc) != 4 or zlib.crc32(body).to_bytes(4, 'big') != crc:
+            raise ValueError(f"Malformed PNG chunk at offset {pos}")
+        chunks.append((body[:4], body[4:]))
+        pos += 12 + length
+        if body[:4] == b'IEND':
+            break
+    if pos != len(data) or not chunks or chunks[-1][0] != b'IEND':
+        raise ValueError("Malformed PNG (missing IEND, or trailing data)")
+    return chunks
+
+
+def png_chunk(chunk_type: bytes, data: bytes) -> bytes:
+    body = chunk_type + data
+    return len(data).to_bytes(4, 'big') + body + zlib.crc32(body).to_bytes(4, 'big')
+
+
+def optimize_png(data: bytes) -> bytes:
+    """Recompress a PNG's image data (see :data:`ZLIB_SETTINGS`); return it if smaller, otherwise the original."""
+    chunks = png_chunks(data)
+    idat = b''.join(chunk_data for chunk_type, chunk_data in chunks if chunk_type == b'IDAT')
+    if not idat:
+        return data
+    raw = zlib.decompress(idat)
+    best = idat
+    for level, mem_level, strategy in ZLIB_SETTINGS:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, zlib.MAX_WBITS, mem_level, strategy)
+        compressed = compressor.compress(raw) + compressor.flush()
+        if len(compressed) < len(best):
+            best = compressed
+    if best is idat:
+        return data
+    pieces = [PNG_SIGNATURE]
+    for chunk_type, chunk_data in chunks:
+        if chunk_type != b'IDAT':
+            pieces.append(png_chunk(chunk_type, chunk_data))
+        elif best is not None:
+            # The first IDAT chunk is replaced by the recompressed data, the rest dropped
+            pieces.append(png_chunk(b'IDAT', best))
+            best = None
+    optimized = b''.join(pieces)
+    return optimized if len(optimized) < len(data) else data
+
+
+def optimize_png_cached(data: bytes, cache: str | None = None) -> bytes:
+    """:func:`optimize_png`, memoized in a ``cache`` directory, keyed by the input's SHA-256.
+
+    An empty cache entry means the image can't be made smaller (e.g. because it was already optimized here), or isn't a
+    valid PNG.
+    """
+    if cache is None:
+        try:
+            return optimize_png(data)
+        except (ValueError, zlib.error):
+            return data
+    digest = sha256(data).hexdigest()
+    path = blob_path(cache, digest)
+    if exists(path):
+        with open(path, 'rb') as f:
+            optimized = f.read()
+        return optimized or data
+    try:
+        optimized = optimize_png(data)
+    except (ValueError, zlib.error):
+        optimized = data
+    if optimized is data:
+        write_blob(cache, digest, b'')
+    else:
+        write_blob(cache, digest, optimized)
+        write_blob(cache, sha256(optimized).hexdigest(), b'')
+    return optimized
+
+
+def optimize_value(value: str | list[str], cache: str | None = None) -> str | list[str]:
+    """Optimize a base64-encoded PNG mimebundle value; return it unchanged if it can't be made smaller (or decoded)."""
+    text = ''.join(value) if isinstance(value, list) else value
+    try:
+        data = b64decode(text)
+    except Base64Error:
+        return value
+    optimized = optimize_png_cached(data, cache)
+    if optimized is data:
+        return value
+    # Keep the value's trailing newline, if any
+    return b64encode(optimized).decode() + ('\n' if text.endswith('\n') else '')
+
+
+def optimize_images(nb: dict, cache: str | None = None, jobs: int | None = None) -> dict:
+    """Losslessly recompress a notebook's PNG outputs and attachments, in a thread pool (zlib releases the GIL).
+
+    Identical images are only processed once, and externalized (``juq-blob:``) values are skipped.
+    """
+    values = {}
+    bundles = []
+    for bundle in mimebundles(nb):
+        value = bundle.get(PNG_MIMETYPE)
+        if value is None or blob_ref(value) is not None:
+            continue
+        key = ''.join(value) if isinstance(value, list) else value
+        values.setdefault(key, value)
+        bundles.append((bundle, key))
+    if not values:
+        return nb
+    with ThreadPoolExecutor(max_workers=jobs or os.cpu_count()) as executor:
+        optimized = dict(zip(values, executor.map(lambda value: optimize_value(value, cache), values.values())))
+    for bundle, key in bundles:
+        if optimized[key] is not values[key]:
+            bundle[PNG_MIMETYPE] = optimized[key]
+    return nb
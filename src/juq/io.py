@@ -0,0 +1,316 @@
+from __future__ import annotations
+
+import gzip
+import json
+import re
+from contextlib import contextmanager, nullcontext
+from io import TextIOWrapper, UnsupportedOperation
+from mmap import ACCESS_READ, mmap
+from os import fstat
+from os.path import splitext
+from stat import S_ISREG
+from sys import stdin, stdout
+from typing import BinaryIO, Iterator
+
+from juq.timing import phase
+
+COMPRESSIONS = ('gzip', 'zstd')
+
+# Output compression is inferred from the output path's extension…
+COMPRESSION_EXTENSIONS = {
+    '.gz': 'gzip',
+    '.zst': 'zstd',
+}
+
+# …and input compression is sniffed from the stream's leading "magic" bytes, so stdin works too.
+COMPRESSION_MAGICS = {
+    b'\x1f\x8b': 'gzip',
+    b'\x28\xb5\x2f\xfd': 'zstd',
+}
+
+# Indent and trailing-newline inference only need to look at the ends of a notebook's JSON.
+HEAD_BYTES = 256
+TAIL_BYTES = 16
+
+WRITE_CHUNK_SIZE = 1 << 20
+
+# JSON strings (which can't contain literal newlines), and brackets
+JSON_TOKEN_RGX = re.compile(r'"(?:[^"\\]|\\.)*"|[{}\[\]]')
+
+
+def infer_compression(path: str | None) -> str | None:
+    """Infer compression ("gzip", "zstd", or None) from a path's extension (e.g. ``.ipynb.gz``)."""
+    if not path or path == '-':
+        return None
+    _, ext = splitext(path)
+    return COMPRESSION_EXTENSIONS.get(ext)
+
+
+def sniff_compression(head: bytes) -> str | None:
+    """Detect compression ("gzip", "zstd", or None) from the first bytes of a stream."""
+    for magic, compression in COMPRESSION_MAGICS.items():
+        if head.startswith(magic):
+            return compression
+    return None
+
+
+def _zstd_file(fileobj: BinaryIO, mode: str):
+    """Wrap a binary file object with zstd (de)compression (stdlib on Python ≥3.14, else ``zstandard``)."""
+    try:
+        from compression.zstd import ZstdFile
+        return ZstdFile(fileobj, mode)
+    except ImportError:
+        pass
+    try:
+        import zstandard
+    except ImportError:
+        raise RuntimeError('zstd (de)compression requires Python ≥3.14 or the `zstandard` package (`pip install juq_py[zstd]`)')
+    return zstandard.open(fileobj, mode, closefd=False)
+
+
+def compressed_file(fileobj: BinaryIO, mode: str, compression: str | None):
+    """Wrap a binary file object to (de)compress through it; ``mode`` is "rb" or "wb".
+
+    The wrapper never closes ``fileobj``. Gzip output omits the filename and mtime from its header, so rewriting an
+    unchanged notebook produces identical bytes.
+    """
+    if compression is None:
+        return nullcontext(fileobj)
+    elif compression == 'gzip':
+        if 'w' in mode:
+            return gzip.GzipFile(filename='', fileobj=fileobj, mode=mode, mtime=0)
+        return gzip.GzipFile(fileobj=fileobj, mode=mode)
+    elif compression == 'zstd':
+        return _zstd_file(fileobj, mode)
+    else:
+        raise ValueError(f"Unrecognized compression {compression!r}; expected one of {COMPRESSIONS}")
+
+
+def infer_nb_indent(nb_str: str) -> int | None:
+    """Infer indentation level from notebook JSON string."""
+    if nb_str.startswith('{'):
+        if nb_str[1:2] == "\n" or nb_str[1:3] == "\r\n":
+            idx = nb_str.index("\n") + 1
+            indent = 0
+            while idx < len(nb_str) and nb_str[idx] == ' ':
+                idx += 1
+                indent += 1
+            return indent
+        else:
+            return None
+    else:
+        raise ValueError(f"Cannot infer `indent` from non-JSON input beginning with {nb_str[:30]}")
+
+
+def infer_nb_trailing_newline(nb_str: str) -> bool:
+    """Infer whether notebook string has trailing newline."""
+    return nb_str.endswith('\n')
+
+
+def _open_nb_in(path: str | None):
+    return nullcontext(stdin.buffer) if path == '-' or path is None else open(path, 'rb')
+
+
+def _read_bytes(f: BinaryIO) -> bytes:
+    compression = sniff_compression(f.peek(4)[:4])
+    with compressed_file(f, 'rb', compression) as g:
+        return g.read()
+
+
+def _read_str(f: BinaryIO) -> str:
+    return _read_bytes(f).decode('utf-8')
+
+
+def _map(f: BinaryIO) -> mmap | None:
+    """Memory-map a (non-empty, regular, unread) file, or return None if that's not possible (e.g. pipes)."""
+    try:
+        fd = f.fileno()
+        st = fstat(fd)
+        pos = f.tell()
+    except (OSError, UnsupportedOperation):
+        return None
+    if not S_ISREG(st.st_mode) or not st.st_size or pos:
+        return None
+    try:
+        return mmap(fd, 0, access=ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+
+
+def _ends(buf) -> tuple[str, str]:
+    """Decode just the first ``HEAD_BYTES`` and last ``TAIL_BYTES`` of a notebook's JSON."""
+    return (
+        bytes(buf[:HEAD_BYTES]).decode('utf-8', 'ignore'),
+        bytes(buf[-TAIL_BYTES:]).decode('utf-8', 'ignore'),
+    )
+
+
+def read_nb_str(path: str | None) -> str:
+    """Read a notebook's JSON text from ``path`` (or stdin), transparently decompressing gzip/zstd input."""
+    with _open_nb_in(path) as f:
+        return _read_str(f)
+
+
+def read_nb_bytes(path: str | None) -> bytes:
+    """Read a notebook's (UTF-8) JSON from ``path`` (or stdin), transparently decompressing gzip/zstd input."""
+    with _open_nb_in(path) as f:
+        return _read_bytes(f)
+
+
+def read_nb_ends(path: str | None) -> tuple[str, str]:
+    """Read the beginning and end of a notebook's JSON text (for :func:`infer_nb_indent` and friends).
+
+    Uncompressed files are memory-mapped, so only the pages at either end are read from disk.
+    """
+    with _open_nb_in(path) as f:
+        mm = _map(f)
+        if mm is not None:
+            with mm:
+                if not sniff_compression(mm[:4]):
+                    return _ends(mm)
+        nb_str = _read_str(f)
+        return nb_str[:HEAD_BYTES], nb_str[-TAIL_BYTES:]
+
+
+def load_nb(path: str | None) -> tuple[dict, str, str]:
+    """Parse a notebook from ``path`` (or stdin); return it along with the beginning and end of its JSON text.
+
+    Uncompressed files (including a file redirected to stdin) are memory-mapped and decoded straight from the map, which
+    avoids an intermediate full-size ``bytes`` copy of the file. The returned head/tail strings are decoded from the
+    ends of the map, for indent/trailing-newline inference.
+    """
+    with phase('read'), _open_nb_in(path) as f:
+        mm = _map(f)
+        nb_str = None
+        if mm is not None:
+            with mm:
+                if not sniff_compression(mm[:4]):
+                    head, tail = _ends(mm)
+                    nb_str = str(mm, 'utf-8')
+        if nb_str is None:
+            nb_str = _read_str(f)
+            head, tail = nb_str[:HEAD_BYTES], nb_str[-TAIL_BYTES:]
+    # The map is released before parsing, so it's never resident alongside the parsed notebook
+    with phase('parse'):
+        nb = json.loads(nb_str)
+    return nb, head, tail
+
+
+def iter_nbs(path: str | None) -> Iterator[tuple[dict, str, str]]:
+    """Parse a stream of notebooks from ``path`` (or stdin), yielding each along with the beginning and end of its JSON.
+
+    Notebooks can be newline-delimited (one per line) or concatenated pretty-printed JSON documents (optionally
+    whitespace-separated). Input is consumed line by line, and each notebook is yielded as soon as its last line has
+    been read, so a long-lived pipeline can interleave reading, transforming, and writing.
+
+    A document's end is found by tracking bracket depth (skipping over strings, which can't span lines), so each line
+    is scanned once, and each document parsed once, regardless of its indentation. Documents must be JSON objects;
+    anything else (e.g. arrays, scalars, or stray text between documents) raises ValueError.
+    """
+    with _open_nb_in(path) as f:
+        compression = sniff_compression(f.peek(4)[:4])
+        with compressed_file(f, 'rb', compression) as g:
+            lines = []
+            depth = 0
+            for line in g:
+                line = line.decode('utf-8')
+                pos = 0
+                for m in JSON_TOKEN_RGX.finditer(line):
+                    token = m.group()
+                    if not depth:
+                        # Between documents: only whitespace, then a JSON object
+                        between = ''.join(lines) + line[pos:m.start()]
+                        if between.strip() or token != '{':
+                            raise _not_nb_error(between + token)
+                    if token in '{[':
+                        depth += 1
+                    elif token in '}]':
+                        depth -= 1
+                        if not depth:
+                            end = m.end()
+                            text = (''.join(lines) + line[pos:end]).lstrip()
+                            with phase('parse'):
+                                nb = json.loads(text)
+                            # The tail includes the character after the document (for trailing-newline inference)
+                            yield nb, text[:HEAD_BYTES], (text + line[end:end + 1])[-TAIL_BYTES:]
+                            lines = []
+                            pos = end
+                rest = line[pos:]
+                if lines or rest.strip():
+                    lines.append(rest)
+            if lines:
+                if not depth:
+                    raise _not_nb_error(''.join(lines))
+                # Trailing incomplete document; let `json.loads` raise a descriptive error
+                json.loads(''.join(lines))
+
+
+def _not_nb_error(text: str) -> ValueError:
+    return ValueError(f"Expected a notebook (JSON object) in stream, found: {text.strip()[:50]!r}")
+
+
+@contextmanager
+def _text_writer(f: BinaryIO):
+    """Wrap a binary stream in a UTF-8 text stream, detaching (rather than closing) it afterwards."""
+    t = TextIOWrapper(f, encoding='utf-8', newline='')
+    try:
+        yield t
+    finally:
+        t.flush()
+        t.detach()
+
+
+@contextmanager
+def open_nb_out(path: str | None, compression: str | None = None):
+    """Open a text stream that writes (optionally compressed) notebook JSON to ``path`` (or stdout)."""
+    if path and path != '-':
+        with open(path, 'wb') as f, compressed_file(f, 'wb', compression) as g, _text_writer(g) as t:
+            yield t
+    elif compression:
+        stdout.flush()
+        with compressed_file(stdout.buffer, 'wb', compression) as g, _text_writer(g) as t:
+            yield t
+        stdout.buffer.flush()
+    else:
+        yield stdout
+
+
+def dumps_nb(
+    nb: dict,
+    indent: int | None = None,
+    ensure_ascii: bool = False,
+    trailing_newline: bool = True,
+) -> str:
+    """Serialize a notebook dict, as ``json.dumps`` (plus optional trailing newline)."""
+    nb_str = json.dumps(nb, indent=indent, ensure_ascii=ensure_ascii)
+    return nb_str + '\n' if trailing_newline else nb_str
+
+
+def dump_nb(
+    nb: dict,
+    f,
+    indent: int | None = None,
+    ensure_ascii: bool = False,
+    trailing_newline: bool = True,
+):
+    """Serialize a notebook dict to a text stream; output is identical to :func:`dumps_nb`.
+
+    Encoded JSON is buffered into ``WRITE_CHUNK_SIZE`` pieces: ``json.dump`` issues a ``write`` per token (slow for large,
+    indented notebooks), while ``json.dumps`` would hold the entire output in memory.
+    """
+    encoder = json.JSONEncoder(indent=indent, ensure_ascii=ensure_ascii)
+    with phase('serialize'):
+        buf = []
+        size = 0
+        for chunk in encoder.iterencode(nb):
+            buf.append(chunk)
+            size += len(chunk)
+            if size >= WRITE_CHUNK_SIZE:
+                with phase('write'):
+                    f.write(''.join(buf))
+                buf.clear()
+                size = 0
+        if trailing_newline:
+            buf.append('\n')
+        with phase('write'):
+            f.write(''.join(buf))
@@ -1,6 +1,7 @@
+from . import timing  # noqa: F401 (first, to time the remaining imports)
 from .cli import cli
-from . import cells, fmt, merge_outputs, renumber
-from .papermill import clean, run
+from . import cells, fmt, merge_outputs, renumber, validate
+from .papermill import clean, dag, queue, run
 
 
 def main():
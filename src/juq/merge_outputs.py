@@ -2,7 +2,7 @@ from copy import deepcopy
 
 from utz import err, decos
 
-from juq.cli import with_nb, cli
+from juq.cli import cli, jobs_opt, stream_opt, watch_opt, with_nb
 
 
 def merge_cell_outputs(cell):
@@ -43,5 +43,8 @@ def merge_outputs(nb):
 
 merge_outputs_cmd = decos(
     cli.command('merge-outputs'),
+    jobs_opt,
+    stream_opt,
+    watch_opt,
     with_nb,
 )(merge_outputs)
@@ -6,7 +6,7 @@ from juq.cli import cli, nb
 
 @cli.group
 def papermill():
-    """Wrapper for Papermill commands (`clean`, `run`)."""
+    """Wrapper for Papermill commands (`clean`, `dag`, `queue`, `run`)."""
     pass
 
 
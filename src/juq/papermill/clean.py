@@ -2,7 +2,7 @@ from __future__ import annotations
 
 from utz import decos
 
-from juq.cli import with_nb, nb as nb_group
+from juq.cli import jobs_opt, stream_opt, watch_opt, with_nb, nb as nb_group
 from juq.papermill import papermill, nb_opts
 
 
@@ -50,7 +50,7 @@ def papermill_clean(
     return nb
 
 
-_clean_opts = [nb_opts, with_nb]
+_clean_opts = [nb_opts, jobs_opt, stream_opt, watch_opt, with_nb]
 
 papermill_clean_cmd = decos(papermill.command('clean'), *_clean_opts)(papermill_clean)
 nb_clean_cmd = decos(nb_group.command('clean'), *_clean_opts)(papermill_clean)
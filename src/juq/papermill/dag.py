@@ -0,0 +1,238 @@
+from __future__ import annotations
+
+import json
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass, field
+from os import utime
+from os.path import abspath, dirname, exists, getmtime, join, normpath, relpath
+from time import time
+
+from click import argument, option
+from utz import decos, err
+
+from juq.cli import nb as nb_group, write_nb
+from juq.io import load_nb
+from juq.papermill import nb_opts, papermill
+
+
+@dataclass
+class NbNode:
+    """A notebook in a DAG, with the files it reads (``inputs``) and writes (``outputs``)."""
+    path: str
+    inputs: list[str] = field(default_factory=list)
+    outputs: list[str] = field(default_factory=list)
+    parameters: dict = field(default_factory=dict)
+
+
+def resolve(base_dir: str, path: str) -> str:
+    return normpath(abspath(join(base_dir, path)))
+
+
+def load_node(nb_path: str, spec: dict | None = None, spec_dir: str | None = None) -> NbNode:
+    """Load a notebook's declared ``inputs``/``outputs``/``parameters``.
+
+    Declarations come from the notebook's ``.metadata.juq`` (with paths relative to the notebook), overridden by a
+    manifest entry ``spec`` (with paths relative to the manifest, ``spec_dir``).
+    """
+    nb_path = normpath(abspath(nb_path))
+    nb_dir = dirname(nb_path)
+    nb, _, _ = load_nb(nb_path)
+    md = nb.get('metadata', {}).get('juq', {})
+    inputs = [ resolve(nb_dir, p) for p in md.get('inputs', []) ]
+    outputs = [ resolve(nb_dir, p) for p in md.get('outputs', []) ]
+    parameters = dict(md.get('parameters', {}))
+    if spec:
+        if 'inputs' in spec:
+            inputs = [ resolve(spec_dir, p) for p in spec['inputs'] ]
+        if 'outputs' in spec:
+            outputs = [ resolve(spec_dir, p) for p in spec['outputs'] ]
+        parameters.update(spec.get('parameters', {}))
+    return NbNode(path=nb_path, inputs=inputs, outputs=outputs, parameters=parameters)
+
+
+def load_manifest(manifest_path: str) -> dict[str, dict]:
+    """Load a manifest, ``{"<notebook path>": {"inputs": [...], "outputs": [...], "parameters": {...}}}``.
+
+    Keys and paths are relative to the manifest's directory; returned keys are absolute.
+    """
+    with open(manifest_path, 'r') as f:
+        manifest = json.load(f)
+    manifest_dir = dirname(abspath(manifest_path))
+    return {
+        resolve(manifest_dir, nb_path): spec
+        for nb_path, spec in manifest.items()
+    }
+
+
+def build_dag(nodes: list[NbNode]) -> dict[str, set[str]]:
+    """Map each notebook to the notebooks that produce its inputs; raise on duplicate producers or cycles."""
+    producers = {}
+    for node in nodes:
+        for output in node.outputs:
+            if output in producers:
+                raise ValueError(f"{output} is an output of both {producers[output]} and {node.path}")
+            producers[output] = node.path
+    deps = {
+        node.path: {
+            producers[input]
+            for input in node.inputs
+            if input in producers and producers[input] != node.path
+        }
+        for node in nodes
+    }
+
+    # Check for cycles (depth-first, tracking the current path)
+    visiting, visited = set(), set()
+
+    def visit(path, stack):
+        if path in visited:
+            return
+        if path in visiting:
+            cycle = stack[stack.index(path):] + [path]
+            raise ValueError(f"Dependency cycle: {' → '.join(cycle)}")
+        visiting.add(path)
+        for dep in sorted(deps[path]):
+            visit(dep, stack + [path])
+        visiting.remove(path)
+        visited.add(path)
+
+    for path in deps:
+        visit(path, [])
+    return deps
+
+
+def is_stale(node: NbNode) -> bool:
+    """Whether a notebook needs to run: it has no declared outputs, or one is missing or older than an input (or the
+    notebook itself)."""
+    if not node.outputs or not all(exists(output) for output in node.outputs):
+        return True
+    oldest_output = min(getmtime(output) for output in node.outputs)
+    sources = [node.path, *node.inputs]
+    return any(exists(source) and getmtime(source) > oldest_output for source in sources)
+
+
+def run_node(
+    path: str,
+    parameters: dict,
+    keep_ids: bool = True,
+    keep_tags: bool | None = None,
+) -> str | None:
+    """Run a notebook in-place (from its own directory), returning an error message on failure.
+
+    After a successful run, the notebook's mtime is set to the time the run started, so outputs written during the run
+    are newer than it, and it's only considered stale again after it (or an input) is subsequently modified. After a
+    failed run, the notebook keeps the mtime of its write, so it stays stale (even if it wrote some of its outputs).
+    """
+    from juq.papermill.run import papermill_run
+    start = time()
+    try:
+        nb, exc = papermill_run(path, keep_ids=keep_ids, keep_tags=keep_tags, parameters=parameters, cwd=dirname(path))
+    except Exception as e:
+        return f"{type(e).__name__}: {e}"
+    write_nb(nb, path)
+    if exc:
+        return f"{type(exc).__name__}: {exc}"
+    utime(path, (start, start))
+    return None
+
+
+def run_dag(
+    nb_paths: tuple[str, ...],
+    manifest: str | None = None,
+    jobs: int = 1,
+    force: bool = False,
+    dry_run: bool = False,
+    keep_ids: bool = True,
+    keep_tags: bool | None = None,
+):
+    """Run notebooks in dependency order, skipping up-to-date ones, and running independent ones in parallel.
+
+    Each notebook declares the files it reads and writes (`inputs`/`outputs`), in its `.metadata.juq` or in a
+    -m/--manifest. A notebook runs after the notebooks producing its inputs, and only if an output is missing or older
+    than an input (or the notebook itself). Notebooks are executed in-place, from their own directories. When a notebook
+    fails, notebooks depending on it are skipped, but others continue.
+    """
+    specs = load_manifest(manifest) if manifest else {}
+    spec_dir = dirname(abspath(manifest)) if manifest else None
+    paths = [ normpath(abspath(p)) for p in nb_paths ] or list(specs)
+    if not paths:
+        raise ValueError("No notebooks specified (pass paths and/or -m/--manifest)")
+    nodes = {
+        path: load_node(path, specs.get(path), spec_dir)
+        for path in dict.fromkeys(paths)
+    }
+    deps = build_dag(list(nodes.values()))
+    dependents = { path: [] for path in nodes }
+    for path, path_deps in deps.items():
+        for dep in path_deps:
+            dependents[dep].append(path)
+
+    def name(path):
+        return relpath(path)
+
+    remaining = { path: set(path_deps) for path, path_deps in deps.items() }
+    ran = set()
+    failed = {}
+    blocked = set()
+    ready = [ path for path in nodes if not remaining[path] ]
+
+    def finish(path, ok):
+        for dependent in dependents[path]:
+            remaining[dependent].discard(path)
+            if not ok:
+                blocked.add(dependent)
+            if not remaining[dependent]:
+                if dependent in blocked:
+                    err(f"Skipping {name(dependent)} (upstream failure)")
+                    finish(dependent, False)
+                else:
+                    ready.append(dependent)
+
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        running = {}
+        while ready or running:
+            while ready and len(running) < jobs:
+                path = ready.pop(0)
+                node = nodes[path]
+                upstream_ran = any(dep in ran for dep in deps[path])
+                if not (force or upstream_ran or is_stale(node)):
+                    err(f"Up to date: {name(path)}")
+                    finish(path, True)
+                    continue
+                if dry_run:
+                    err(f"Would run: {name(path)}")
+                    ran.add(path)
+                    finish(path, True)
+                    continue
+                err(f"Running: {name(path)}")
+                future = executor.submit(run_node, path, node.parameters, keep_ids=keep_ids, keep_tags=keep_tags)
+                running[future] = path
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                path = running.pop(future)
+                error = future.result()
+                if error:
+                    err(f"Failed: {name(path)}: {error}")
+                    failed[path] = error
+                else:
+                    err(f"Finished: {name(path)}")
+                    ran.add(path)
+                finish(path, not error)
+
+    if failed:
+        raise RuntimeError(f"{len(failed)} notebook(s) failed ({len(blocked)} skipped): {', '.join(map(name, failed))}")
+
+
+_dag_opts = [
+    nb_opts,
+    option('-f', '--force', is_flag=True, help='Run all notebooks, even if their outputs are up to date'),
+    option('-j', '--jobs', type=int, default=1, help='Max number of notebooks to run in parallel (default: 1)'),
+    option('-m', '--manifest', help='JSON file mapping notebook paths to {"inputs": [...], "outputs": [...], "parameters": {...}} (default: read from each notebook\'s `.metadata.juq`)'),
+    option('-n', '--dry-run', is_flag=True, help='Log which notebooks would run, without running them'),
+    argument('nb_paths', nargs=-1),
+]
+
+papermill_dag_cmd = decos(papermill.command('dag'), *_dag_opts)(run_dag)
+nb_dag_cmd = decos(nb_group.command('dag'), *_dag_opts)(run_dag)
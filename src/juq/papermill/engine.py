@@ -0,0 +1,122 @@
+"""Papermill engine that coalesces "stream" outputs while a notebook runs (instead of only afterwards).
+
+Kernels emit a "stream" message per stdout/stderr flush (e.g. per progress bar update), which Papermill stores as a
+separate output, so that memory use and autosave time grow with the number of flushes. Here, consecutive same-name
+stream messages are instead appended to one output, whose text is stored as a list of chunks (a valid "multiline
+string"), merged so that there are O(log n) of them (similar to a binary counter), and joined when the cell finishes.
+"""
+from __future__ import annotations
+
+import re
+
+from nbformat.v4 import output_from_msg
+from papermill.clientwrap import PapermillNotebookClient
+from papermill.engines import NBClientEngine, papermill_engines
+from papermill.log import logger
+from papermill.utils import merge_kwargs, remove_args
+from traitlets import Bool
+
+ENGINE_NAME = 'juq'
+
+# Anything-but-newline followed by a carriage return (that isn't the end of the text, or part of a "\r\n"), as
+# rendered by terminals and Jupyter frontends (cf. `nbclient`'s `coalesce_streams`)
+CR_RGX = re.compile(r'.*\r(?=[^\n])')
+
+
+def collapse_cr(text: str) -> str:
+    """Drop text overwritten by carriage returns (e.g. progress bar updates)."""
+    return CR_RGX.sub('', text)
+
+
+def append_text(chunks: list[str], text: str, collapse: bool = False):
+    """Append ``text`` to a stream output's ``chunks``, merging chunks so that O(log n) remain.
+
+    With ``collapse``, the last chunk is the current (partial) line, so that carriage returns can be applied to it
+    without re-processing earlier lines.
+    """
+    line = None
+    if collapse:
+        line = (chunks.pop() if chunks else '') + text
+        if '\r' in line:
+            line = collapse_cr(line)
+        text, sep, line = line.rpartition('\n')
+        text += sep
+    if text:
+        chunks.append(text)
+        while len(chunks) > 1 and len(chunks[-2]) <= len(chunks[-1]):
+            last = chunks.pop()
+            chunks[-1] += last
+    if collapse:
+        chunks.append(line)
+
+
+class CoalescingNotebookClient(PapermillNotebookClient):
+    """Papermill client that coalesces consecutive same-name "stream" outputs as they arrive."""
+
+    collapse_cr = Bool(False).tag(config=True)
+
+    def output(self, outs, msg, display_id, cell_index):
+        if msg['msg_type'] != 'stream' or display_id:
+            return super().output(outs, msg, display_id, cell_index)
+        content = msg['content']
+        parent_msg_id = msg['parent_header'].get('msg_id')
+        last = outs[-1] if outs else None
+        if (
+            last is not None
+            and last.get('output_type') == 'stream'
+            and last.get('name') == content.get('name')
+            and isinstance(last.get('text'), list)
+            and not self.clear_before_next_output
+            and not self.output_hook_stack[parent_msg_id]
+        ):
+            append_text(last['text'], content['text'], collapse=self.collapse_cr)
+            # Returned for Papermill's --log-output, which logs each new piece of output
+            return output_from_msg(msg)
+        out = super().output(outs, msg, display_id, cell_index)
+        if out is not None and out is (outs[-1] if outs else None):
+            text, out['text'] = out['text'], []
+            append_text(out['text'], text, collapse=self.collapse_cr)
+        return out
+
+    def execute_cell(self, cell, cell_index, *args, **kwargs):
+        try:
+            return super().execute_cell(cell, cell_index, *args, **kwargs)
+        finally:
+            for output in self.nb.cells[cell_index].get('outputs', []):
+                if output.get('output_type') == 'stream' and isinstance(output.get('text'), list):
+                    output['text'] = ''.join(output['text'])
+
+
+class CoalescingEngine(NBClientEngine):
+    """Like Papermill's default ("nbclient") engine, but using :class:`CoalescingNotebookClient`."""
+
+    @classmethod
+    def execute_managed_notebook(
+        cls,
+        nb_man,
+        kernel_name,
+        log_output=False,
+        stdout_file=None,
+        stderr_file=None,
+        start_timeout=60,
+        execution_timeout=None,
+        collapse_cr=False,
+        **kwargs,
+    ):
+        kwargs = remove_args(['input_path'], **kwargs)
+        safe_kwargs = remove_args(['timeout', 'startup_timeout'], **kwargs)
+        final_kwargs = merge_kwargs(
+            safe_kwargs,
+            timeout=execution_timeout if execution_timeout else kwargs.get('timeout'),
+            startup_timeout=start_timeout,
+            kernel_name=kernel_name,
+            log=logger,
+            log_output=log_output,
+            stdout_file=stdout_file,
+            stderr_file=stderr_file,
+            collapse_cr=collapse_cr,
+        )
+        return CoalescingNotebookClient(nb_man, **final_kwargs).execute()
+
+
+papermill_engines.register(ENGINE_NAME, CoalescingEngine)
@@ -0,0 +1,297 @@
+from __future__ import annotations
+
+import json
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from os import getpid
+from os.path import abspath, dirname
+from socket import gethostname
+from sys import stdout
+from threading import Event, Thread
+from time import sleep, time
+from typing import Tuple
+
+from click import Choice, argument, group, option
+from utz import decos, err
+
+from juq.cli import nb as nb_group, write_nb
+from juq.papermill import nb_opts, papermill
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    nb_path TEXT NOT NULL,
+    out_path TEXT NOT NULL,
+    parameters TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    worker TEXT,
+    lease_expires REAL,
+    error TEXT,
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+)
+'''
+STATUSES = ('pending', 'running', 'done', 'failed')
+LEASE = 60.
+POLL = 5.
+
+
+def connect(db_path: str) -> sqlite3.Connection:
+    """Open (and initialize, if necessary) a queue database.
+
+    Transactions are managed explicitly (see :func:`transaction`); the generous ``timeout`` waits out other workers'
+    locks, which can be slow to acquire on network filesystems.
+    """
+    conn = sqlite3.connect(db_path, timeout=60, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute(SCHEMA)
+    return conn
+
+
+@contextmanager
+def transaction(conn: sqlite3.Connection):
+    """Hold the database's write lock (``BEGIN IMMEDIATE``), so that reads and updates are atomic across workers."""
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        yield conn
+    except BaseException:
+        conn.execute('ROLLBACK')
+        raise
+    conn.execute('COMMIT')
+
+
+def add_job(
+    conn: sqlite3.Connection,
+    nb_path: str,
+    out_path: str | None = None,
+    parameters: dict | None = None,
+    max_attempts: int = 3,
+) -> int:
+    """Enqueue a notebook execution (writing to ``out_path``, default: in-place); return the job's id."""
+    now = time()
+    cursor = conn.execute(
+        'INSERT INTO jobs (nb_path, out_path, parameters, max_attempts, created, updated) VALUES (?, ?, ?, ?, ?, ?)',
+        (abspath(nb_path), abspath(out_path or nb_path), json.dumps(parameters or {}), max_attempts, now, now),
+    )
+    return cursor.lastrowid
+
+
+def claim_job(conn: sqlite3.Connection, worker: str, lease: float = LEASE) -> sqlite3.Row | None:
+    """Lease the oldest pending job (or one whose previous worker's lease expired, e.g. because it crashed)."""
+    now = time()
+    with transaction(conn):
+        conn.execute(
+            "UPDATE jobs SET status = 'failed', error = 'Lease expired (worker died?)', updated = ? "
+            "WHERE status = 'running' AND lease_expires < ? AND attempts >= max_attempts",
+            (now, now),
+        )
+        job = conn.execute(
+            "SELECT * FROM jobs WHERE status = 'pending' OR (status = 'running' AND lease_expires < ?) "
+            "ORDER BY id LIMIT 1",
+            (now,),
+        ).fetchone()
+        if job is None:
+            return None
+        conn.execute(
+            "UPDATE jobs SET status = 'running', worker = ?, lease_expires = ?, attempts = attempts + 1, updated = ? "
+            "WHERE id = ?",
+            (worker, now + lease, now, job['id']),
+        )
+        return conn.execute('SELECT * FROM jobs WHERE id = ?', (job['id'],)).fetchone()
+
+
+def num_unfinished(conn: sqlite3.Connection) -> int:
+    return conn.execute("SELECT COUNT(*) FROM jobs WHERE status IN ('pending', 'running')").fetchone()[0]
+
+
+def finish_job(conn: sqlite3.Connection, job: sqlite3.Row, worker: str, error: str | None = None) -> str | None:
+    """Mark a job done, or (on error) pending again (if it has attempts left) or failed; return its new status.
+
+    Returns None if the job's lease was lost (another worker took it over), in which case it's left alone.
+    """
+    if error is None:
+        status = 'done'
+    elif job['attempts'] < job['max_attempts']:
+        status = 'pending'
+    else:
+        status = 'failed'
+    with transaction(conn):
+        cursor = conn.execute(
+            "UPDATE jobs SET status = ?, error = ?, lease_expires = NULL, updated = ? "
+            "WHERE id = ? AND worker = ? AND status = 'running'",
+            (status, error, time(), job['id'], worker),
+        )
+    return status if cursor.rowcount else None
+
+
+def heartbeat(db_path: str, job_id: int, worker: str, lease: float, stop: Event):
+    """Extend a job's lease every ``lease / 3`` seconds, until ``stop`` is set."""
+    conn = connect(db_path)
+    try:
+        while not stop.wait(lease / 3):
+            conn.execute(
+                "UPDATE jobs SET lease_expires = ? WHERE id = ? AND worker = ? AND status = 'running'",
+                (time() + lease, job_id, worker),
+            )
+    finally:
+        conn.close()
+
+
+def run_job(job: sqlite3.Row, keep_ids: bool = True, keep_tags: bool | None = None) -> str | None:
+    """Execute a job's notebook (from its own directory), write the cleaned result; return an error message on
+    failure."""
+    from juq.papermill.run import papermill_run
+    nb_path = job['nb_path']
+    try:
+        nb, exc = papermill_run(
+            nb_path,
+            keep_ids=keep_ids,
+            keep_tags=keep_tags,
+            parameters=json.loads(job['parameters']),
+            cwd=dirname(nb_path),
+        )
+        write_nb(nb, job['out_path'])
+    except Exception as e:
+        return f"{type(e).__name__}: {e}"
+    if exc:
+        # Summarize Papermill errors by the exception raised in the notebook (instead of the full traceback)
+        ename = getattr(exc, 'ename', None)
+        return f"{type(exc).__name__}: {ename}: {exc.evalue}" if ename else f"{type(exc).__name__}: {exc}"
+    return None
+
+
+def work(
+    db_path: str,
+    drain: bool = False,
+    lease: float = LEASE,
+    poll: float = POLL,
+    keep_ids: bool = True,
+    keep_tags: bool | None = None,
+) -> int:
+    """Run jobs from the queue until interrupted (or, with ``drain``, until all jobs are done or failed); return the
+    number of jobs that failed (for good) in this worker."""
+    worker = f'{gethostname()}:{getpid()}'
+    conn = connect(db_path)
+    num_failed = 0
+    try:
+        while True:
+            job = claim_job(conn, worker, lease=lease)
+            if job is None:
+                # When draining, wait for other workers' jobs (which may fail and be retried) to finish
+                if drain and not num_unfinished(conn):
+                    return num_failed
+                sleep(poll)
+                continue
+            job_id = job['id']
+            err(f"{worker}: running job {job_id} (attempt {job['attempts']}/{job['max_attempts']}): {job['nb_path']}")
+            stop = Event()
+            thread = Thread(target=heartbeat, args=(db_path, job_id, worker, lease, stop), daemon=True)
+            thread.start()
+            try:
+                error = run_job(job, keep_ids=keep_ids, keep_tags=keep_tags)
+            finally:
+                stop.set()
+                thread.join()
+            status = finish_job(conn, job, worker, error)
+            if status is None:
+                err(f"{worker}: lost lease on job {job_id}")
+            elif error:
+                err(f"{worker}: job {job_id} {'will be retried' if status == 'pending' else 'failed'}: {error}")
+                if status == 'failed':
+                    num_failed += 1
+            else:
+                err(f"{worker}: finished job {job_id}: {job['out_path']}")
+    finally:
+        conn.close()
+
+
+@group('queue')
+def queue():
+    """Run notebooks from a queue (SQLite database), e.g. shared by workers on several machines."""
+    pass
+
+
+papermill.add_command(queue)
+nb_group.add_command(queue)
+
+
+@queue.command('add')
+@option('-o', '--out-path', help='Path to write the executed notebook to (default: overwrite NB_PATH)')
+@option('-p', '--parameter', 'parameter_strs', multiple=True, help='"<k>=<v>" variable to set, while executing the notebook')
+@option('-r', '--max-attempts', type=int, default=3, help='Max number of times to run the notebook, if it fails (default: 3)')
+@argument('db_path')
+@argument('nb_paths', nargs=-1, required=True)
+def queue_add(
+    db_path: str,
+    nb_paths: Tuple[str, ...],
+    out_path: str | None = None,
+    parameter_strs: Tuple[str, ...] = (),
+    max_attempts: int = 3,
+):
+    """Enqueue executions of one or more notebooks; print each job's id."""
+    from juq.papermill.run import parse_parameters
+    if out_path and len(nb_paths) > 1:
+        raise ValueError("-o/--out-path only supported when enqueueing one notebook")
+    parameters = parse_parameters(parameter_strs)
+    conn = connect(db_path)
+    try:
+        for nb_path in nb_paths:
+            job_id = add_job(conn, nb_path, out_path=out_path, parameters=parameters, max_attempts=max_attempts)
+            print(job_id)
+    finally:
+        conn.close()
+
+
+@queue.command('ls')
+@option('-s', '--status', type=Choice(STATUSES), multiple=True, help='Only list jobs with this status (repeatable)')
+@argument('db_path')
+def queue_ls(db_path: str, status: Tuple[str, ...] = ()):
+    """List jobs (TSV: id, status, attempts, worker, notebook, output path, error)."""
+    conn = connect(db_path)
+    try:
+        query = 'SELECT * FROM jobs'
+        if status:
+            query += f" WHERE status IN ({', '.join('?' * len(status))})"
+        for job in conn.execute(query + ' ORDER BY id', status):
+            cols = [job['id'], job['status'], f"{job['attempts']}/{job['max_attempts']}", job['worker'] or '', job['nb_path'], job['out_path'], job['error'] or '']
+            stdout.write('\t'.join(str(col).replace('\n', ' ') for col in cols) + '\n')
+    finally:
+        conn.close()
+
+
+@decos(
+    queue.command('work'),
+    nb_opts,
+    option('-d', '--drain', is_flag=True, help='Exit once all jobs are done or failed (default: keep polling for new jobs)'),
+    option('-j', '--jobs', type=int, default=1, help='Number of worker processes (default: 1)'),
+    option('-l', '--lease', type=float, default=LEASE, help=f'Seconds a job stays leased without a heartbeat (from a live worker), before other workers may retry it (default: {LEASE:g})'),
+    option('-P', '--poll', type=float, default=POLL, help=f'Seconds to wait between checks for new jobs (default: {POLL:g})'),
+    argument('db_path'),
+)
+def queue_work(
+    db_path: str,
+    drain: bool = False,
+    jobs: int = 1,
+    lease: float = LEASE,
+    poll: float = POLL,
+    keep_ids: bool = True,
+    keep_tags: bool | None = None,
+):
+    """Run notebooks from the queue, writing cleaned results (as `juq nb run` does).
+
+    Each worker leases a job, and extends the lease while the notebook runs; jobs whose workers die are retried after
+    their lease expires. Failed jobs are retried up to their max attempts (`queue add -r`). Exits with status 1 if any
+    jobs failed (with --drain).
+    """
+    kwargs = dict(drain=drain, lease=lease, poll=poll, keep_ids=keep_ids, keep_tags=keep_tags)
+    if jobs == 1:
+        num_failed = work(db_path, **kwargs)
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            futures = [ executor.submit(work, db_path, **kwargs) for _ in range(jobs) ]
+            num_failed = sum(future.result() for future in futures)
+    if num_failed:
+        raise SystemExit(1)
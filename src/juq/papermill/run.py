@@ -1,23 +1,29 @@
 from __future__ import annotations
 
 import json
-from os.path import join
+from os.path import basename, join
 from sys import stdout
 from tempfile import TemporaryDirectory
 from typing import Tuple
 
 from click import option
 from papermill.cli import _resolve_type
-from utz import decos, env
+from utz import decos, env, err
 
+from juq.cells import parse_cells_slice
 from juq.cli import with_nb
 from juq.merge_outputs import merge_outputs
 from juq.papermill import nb_opts, papermill
 from juq.cli import nb as nb_group
 from juq.papermill.clean import papermill_clean
+from juq.renumber import renumber
 
 
 INJECTED_TAGS = { "papermill-error-cell-tag", 'injected-parameters' }
+PARAMETERS_TAGS = { 'parameters', 'injected-parameters' }
+
+# Marks each cell of a partial (-c/--cells, -f/--from-cell) run with its index in the full notebook
+CELL_IDX_KEY = 'juq-cell-idx'
 
 
 class AlignmentError(ValueError):
@@ -31,6 +37,11 @@ class AlignmentError(ValueError):
     pass
 
 
+def join_source(source):
+    """Cell sources may be strings or lists of lines (e.g. Papermill always writes the latter)."""
+    return ''.join(source) if isinstance(source, list) else source
+
+
 def harmonize_empty_tags(cells0, cells1, exc):
     """When -k/--keep-tags is not specified, remove empty ``.cells[].metadata.tags`` arrays added by Papermill."""
     idx1 = 0
@@ -58,8 +69,8 @@ def harmonize_empty_tags(cells0, cells1, exc):
                     raise AlignmentError(f"{tags0=} != {tags1=}")
             else:
                 cell1, md1, tags1 = skip_injected_param_cells()
-                source0 = cell0.get('source')
-                source1 = cell1.get('source')
+                source0 = join_source(cell0.get('source'))
+                source1 = join_source(cell1.get('source'))
                 if source0 != source1:
                     raise AlignmentError(f"Cell {idx0=}: {source0=} != {source1=}")
                 if 'tags' not in md0 and tags1 == []:
@@ -78,6 +89,84 @@ def harmonize_empty_tags(cells0, cells1, exc):
     return exc
 
 
+def parse_parameters(parameter_strs: Tuple[str, ...]) -> dict:
+    """Parse "<k>=<v>" strings (-p/--parameter), inferring value types like Papermill does."""
+    parameters = {}
+    for param_str in parameter_strs:
+        pcs = param_str.split('=', 1)
+        if len(pcs) != 2:
+            raise ValueError(f"Unrecognized parameter string: {param_str}")
+        k, v = pcs
+        parameters[k] = _resolve_type(v)
+    return parameters
+
+
+def select_cells(
+    cells: list[dict],
+    cells_slice: str | None = None,
+    from_cell: int | None = None,
+) -> list[int]:
+    """Indices of the cells to run: a range (``cells_slice``, e.g. "3:5", or several, e.g. "0:2,38:"), or all cells
+    from index ``from_cell`` on.
+
+    Cells tagged "parameters" (or "injected-parameters") before the range are also included, so that parameters are
+    defined (and injected) as in a full run.
+    """
+    if cells_slice is not None and from_cell is not None:
+        raise ValueError("Pass -c/--cells xor -f/--from-cell, not both")
+    slice_strs = cells_slice.split(',') if cells_slice is not None else [f'{from_cell}:']
+    idxs = list(range(len(cells)))
+    selected = set()
+    for slice_str in slice_strs:
+        idx = parse_cells_slice(slice_str)
+        if isinstance(idx, int):
+            selected.add(idxs[idx])
+        else:
+            selected.update(idxs[idx])
+    selected = sorted(selected)
+    if not selected:
+        raise ValueError(f"No cells selected ({cells_slice or f'{from_cell}:'}, notebook has {len(cells)} cells)")
+    params = [
+        i
+        for i in range(selected[0])
+        if PARAMETERS_TAGS & set(cells[i].get('metadata', {}).get('tags', []))
+    ]
+    return params + selected
+
+
+def merge_cells(cells0: list[dict], cells1: list[dict], idxs: list[int], exc: Exception | None) -> list[dict]:
+    """Merge the executed cells of a partial run (``cells1``, marked with ``CELL_IDX_KEY``) into the full notebook.
+
+    Cells that weren't run (outside the selected range, or after an error) keep their existing outputs. Unmarked cells
+    added by Papermill (injected parameters, error banners) are placed after the preceding executed cell. Selected cells
+    missing from the output (e.g. a stale "injected-parameters" cell that Papermill replaced) are dropped.
+    """
+    executed = {}
+    added = {}
+    prev = None
+    for cell in cells1:
+        md = cell.get('metadata', {})
+        idx = md.pop(CELL_IDX_KEY, None)
+        if idx is None:
+            added.setdefault(prev, []).append(cell)
+            continue
+        cell0 = cells0[idx]
+        if exc and cell['cell_type'] == 'code' and cell.get('execution_count') is None:
+            # Not reached, due to an earlier error
+            cell = cell0
+        executed[idx] = cell
+        prev = idx
+
+    cells = added.get(None, [])
+    for idx, cell0 in enumerate(cells0):
+        if idx in executed:
+            cells.append(executed[idx])
+        elif idx not in idxs:
+            cells.append(cell0)
+        cells += added.get(idx, [])
+    return cells
+
+
 def papermill_run(
     nb_path,
     keep_ids: bool = True,
@@ -85,27 +174,66 @@ def papermill_run(
     parameter_strs: Tuple[str, ...] = (),
     request_save_on_cell_execute: bool | None = None,
     autosave_cell_every: int | None = None,
+    parameters: dict | None = None,
+    cwd: str | None = None,
+    cells_slice: str | None = None,
+    from_cell: int | None = None,
+    until_error: bool = False,
+    coalesce_streams: bool = True,
+    collapse_cr: bool = False,
 ):
-    """Run a notebook using Papermill, clean nondeterministic metadata, normalize output streams."""
+    """Run a notebook using Papermill, clean nondeterministic metadata, normalize output streams.
+
+    -c/--cells (e.g. "3:5") or -f/--from-cell run a subset of cells (in a fresh kernel, along with any "parameters"
+    cells), leaving other cells' outputs as-is, and renumbering execution counts afterwards. With -e/--until-error, cells
+    not reached (after an error) also keep their existing outputs.
+
+    Consecutive "stream" outputs are merged while the notebook runs, keeping memory use and autosave time proportional
+    to the size of the output (rather than the number of flushes); --collapse-cr also drops text overwritten by
+    carriage returns (e.g. progress bar updates).
+    """
+    if collapse_cr and not coalesce_streams:
+        raise ValueError("--collapse-cr requires --coalesce-streams")
+    engine_kwargs = {}
+    if coalesce_streams:
+        from juq.papermill.engine import ENGINE_NAME
+        engine_kwargs = dict(engine_name=ENGINE_NAME, collapse_cr=collapse_cr)
     from papermill import PapermillExecutionError, execute_notebook
 
-    parameters = {}
-    for param_str in parameter_strs:
-        pcs = param_str.split('=', 1)
-        if len(pcs) != 2:
-            raise ValueError(f"Unrecognized parameter string: {param_str}")
-        k, v = pcs
-        parameters[k] = _resolve_type(v)
+    parameters = { **(parameters or {}), **parse_parameters(parameter_strs) }
 
+    partial = cells_slice is not None or from_cell is not None
+    # Executed cells are merged into the input notebook's cells, for partial runs, and so that cells not reached (with
+    # -e/--until-error) keep their existing outputs
+    merge = partial or until_error
     exc = None
     with TemporaryDirectory() as tmpdir:
         tmp_out = join(tmpdir, 'out.ipynb')
+        in_path = nb_path
+        if merge:
+            with open(nb_path, 'r') as f:
+                full_nb = json.load(f)
+            cells0 = full_nb['cells']
+            if partial:
+                idxs = select_cells(cells0, cells_slice=cells_slice, from_cell=from_cell)
+            else:
+                idxs = list(range(len(cells0)))
+            sub_cells = []
+            for idx in idxs:
+                cell = json.loads(json.dumps(cells0[idx]))
+                cell.setdefault('metadata', {})[CELL_IDX_KEY] = idx
+                sub_cells.append(cell)
+            in_path = join(tmpdir, basename(nb_path))
+            with open(in_path, 'w') as f:
+                json.dump({ **full_nb, 'cells': sub_cells }, f)
         try:
             with env(PAPERMILL='1'):
                 execute_notebook(
-                    nb_path, tmp_out,
+                    in_path, tmp_out,
                     parameters=parameters,
                     request_save_on_cell_execute=request_save_on_cell_execute,
+                    cwd=cwd,
+                    **engine_kwargs,
                     **({} if autosave_cell_every is None else dict(autosave_cell_every=autosave_cell_every)),
                 )
         except PapermillExecutionError as e:
@@ -114,20 +242,29 @@ def papermill_run(
         with open(tmp_out, 'r') as f:
             nb = json.load(f)
 
-    if keep_tags is None:
-        with open(nb_path, 'r') as f:
-            nb0 = json.load(f)
-        cells0 = nb0['cells']
-        cells1 = nb['cells']
-        exc = harmonize_empty_tags(cells0, cells1, exc)
+        if keep_tags is None:
+            with open(in_path, 'r') as f:
+                nb0 = json.load(f)
+            exc = harmonize_empty_tags(nb0['cells'], nb['cells'], exc)
 
     nb = papermill_clean(nb, keep_ids=keep_ids, keep_tags=keep_tags)
     nb = merge_outputs(nb)
+    if merge:
+        nb['cells'] = merge_cells(cells0, nb['cells'], idxs, exc)
+        nb = renumber(nb, quiet=True)
+    if exc and until_error:
+        err(f"Stopped at error: {exc}")
+        exc = None
     return nb, exc
 
 
 _run_opts = [
     nb_opts,
+    option('--coalesce-streams/--no-coalesce-streams', default=True, help='Merge consecutive "stream" outputs while the notebook runs (default: true)'),
+    option('--collapse-cr', is_flag=True, help='Drop stream output overwritten by carriage returns (e.g. progress bar updates), keeping only the final state of each line'),
+    option('-c', '--cells', 'cells_slice', help='Only run this cell, or range(s) of cells (e.g. "3", "3:5", "0:2,-2:"; same syntax as `juq cells`), along with any "parameters" cells; other cells keep their existing outputs'),
+    option('-e', '--until-error', is_flag=True, help='Stop at the first error, and write the notebook executed up to that point (later cells keep their existing outputs), without failing'),
+    option('-f', '--from-cell', type=int, help='Only run cells from this index onward (like `-c <N>:`)'),
     option('-p', '--parameter', 'parameter_strs', multiple=True, help='"<k>=<v>" variable to set, while executing the notebook'),
     option('-s', '--request-save-on-cell-execute', is_flag=True, default=None, help="Request save notebook after each cell execution"),
     option('-S', '--autosave-cell-every', type=int, help="How often in seconds to autosave the notebook during long cell executions (0 to disable)"),
@@ -0,0 +1,133 @@
+"""Transform a single (large) notebook in parallel (-j/--jobs): its JSON text is split into chunks of consecutive cells,
+which are parsed, transformed, and serialized in a process pool, then stitched back together.
+
+Literal newlines only appear between JSON tokens (newlines in strings are escaped), so in indented notebook JSON, the
+"cells" array and the boundaries between its elements can be found by searching for lines with a given indentation,
+without tokenizing the rest of the file. The output is identical to serializing the whole transformed notebook with
+:func:`juq.io.dump_nb`.
+
+Only transforms that act on each cell independently (e.g. :func:`juq.fmt.filter_cell`,
+:func:`juq.papermill.clean.papermill_clean_cell`, :func:`juq.merge_outputs.merge_cell_outputs`) can be parallelized
+this way: each chunk's cells are transformed as a notebook of their own (with the original notebook's metadata).
+"""
+from __future__ import annotations
+
+import json
+from concurrent.futures import ProcessPoolExecutor
+from copy import deepcopy
+from functools import partial
+from typing import Callable, Iterator
+
+from utz import call
+
+from juq import timing
+from juq.io import HEAD_BYTES, TAIL_BYTES, infer_nb_indent, read_nb_bytes
+
+# Chunks per worker process; smaller chunks balance uneven cells better, at the cost of more IPC
+CHUNKS_PER_JOB = 4
+
+
+def split_cells(data: bytes, indent: int, num_chunks: int) -> tuple[int, int, list[tuple[int, int]]] | None:
+    """Locate the elements of the top-level "cells" array in notebook JSON (indented by ``indent`` spaces), and split
+    them into about ``num_chunks`` runs of consecutive cells, of similar sizes.
+
+    Returns the byte offsets of the first cell's start and the last cell's end, and the ``(start, end)`` range of each
+    chunk; or None if the notebook's layout isn't recognized (e.g. unindented JSON, "\\r\\n" newlines, or no cells).
+    """
+    if indent < 1:
+        return None
+    ind = b' ' * indent
+    ind2 = ind * 2
+    # A line with exactly ``indent`` spaces is a member of the top-level object; with ``2 * indent``, an array element
+    start_marker = b'\n' + ind + b'"cells": [\n' + ind2 + b'{'
+    idx = data.find(start_marker)
+    if idx < 0:
+        return None
+    start = idx + len(start_marker) - 1
+    end = data.find(b'\n' + ind + b']', start)
+    if end < 0:
+        return None
+    sep = b'\n' + ind2 + b'},\n' + ind2 + b'{'
+    target = max((end - start) // num_chunks, 1)
+    ranges = []
+    pos = start
+    while True:
+        cut = data.find(sep, pos + target, end)
+        if cut < 0:
+            ranges.append((pos, end))
+            return start, end, ranges
+        ranges.append((pos, cut + len(ind2) + 2))
+        pos = cut + len(sep) - 1
+
+
+def load_chunked(path: str | None, jobs: int) -> tuple[dict, str, str, list[bytes] | None]:
+    """Read a notebook, and split its cells into chunks of JSON text (for ``jobs`` worker processes).
+
+    Returns the notebook without its cells (its "skeleton"), the beginning and end of its JSON text (as
+    :func:`juq.io.load_nb` does), and the chunks. If the notebook can't be split, it's parsed whole (as usual), and the
+    returned chunks are None.
+    """
+    with timing.phase('read'):
+        data = read_nb_bytes(path)
+    head = data[:HEAD_BYTES].decode('utf-8', 'ignore')
+    tail = data[-TAIL_BYTES:].decode('utf-8', 'ignore')
+    indent = infer_nb_indent(head)
+    split = None if indent is None else split_cells(data, indent, jobs * CHUNKS_PER_JOB)
+    with timing.phase('parse'):
+        if split is None:
+            return json.loads(data), head, tail, None
+        start, end, ranges = split
+        skeleton = json.loads(data[:start] + data[end:])
+    return skeleton, head, tail, [ data[a:b] for a, b in ranges ]
+
+
+def dumps_value(value, indent: int, ensure_ascii: bool, depth: int) -> str:
+    """Serialize a JSON value nested ``depth`` levels deep in an indented document (as ``json.dumps`` would)."""
+    return json.dumps(value, indent=indent, ensure_ascii=ensure_ascii).replace('\n', '\n' + ' ' * (indent * depth))
+
+
+def transform_chunk(
+    func: Callable,
+    kwargs: dict,
+    skeleton: dict,
+    chunk: bytes,
+    indent: int,
+    ensure_ascii: bool,
+) -> str:
+    """Parse a chunk of cells, transform it (as a notebook with ``skeleton``'s metadata), and serialize the resulting
+    cells (as comma-separated elements of the "cells" array)."""
+    cells = json.loads(b'[' + chunk + b']')
+    nb = call(func, **kwargs, nb={ **skeleton, 'cells': cells })
+    sep = ',\n' + ' ' * (indent * 2)
+    return sep.join(dumps_value(cell, indent, ensure_ascii, depth=2) for cell in nb['cells'])
+
+
+def iter_transformed(
+    func: Callable,
+    kwargs: dict,
+    chunks: list[bytes],
+    jobs: int,
+    indent: int,
+    ensure_ascii: bool = False,
+) -> Iterator[str]:
+    """Apply a (cell-wise) notebook transform ``func`` to a chunked notebook (``kwargs['nb']`` is its skeleton), yielding
+    pieces of the output JSON in order (as chunks are completed)."""
+    kwargs = dict(kwargs)
+    skeleton = kwargs.pop('nb')
+    nb = call(func, **kwargs, nb={ **deepcopy(skeleton), 'cells': [] })
+    ind = ' ' * indent
+    worker = partial(transform_chunk, func, kwargs, skeleton, indent=indent, ensure_ascii=ensure_ascii)
+    yield '{'
+    for idx, (k, v) in enumerate(nb.items()):
+        yield f'{"," if idx else ""}\n{ind}{json.dumps(k, ensure_ascii=ensure_ascii)}: '
+        if k != 'cells':
+            yield dumps_value(v, indent, ensure_ascii, depth=1)
+            continue
+        num_cells = 0
+        with ProcessPoolExecutor(max_workers=min(jobs, len(chunks))) as executor:
+            for cells_str in executor.map(worker, chunks):
+                if cells_str:
+                    yield f'{"," if num_cells else "["}\n{ind * 2}{cells_str}'
+                    num_cells += 1
+        yield f'\n{ind}]' if num_cells else '[]'
+    yield '\n}'
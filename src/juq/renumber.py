@@ -2,7 +2,7 @@ from click import option
 from nbformat import NotebookNode
 from utz import silent, err, decos
 
-from juq.cli import cli, with_nb
+from juq.cli import cli, stream_opt, with_nb
 
 
 def renumber(
@@ -35,5 +35,6 @@ def renumber(
 renumber_cmd = decos(
     cli.command,
     option('-q', '--quiet', is_flag=True, help="Suppress logging info about each `execution_count` update to stderr"),
+    stream_opt,
     with_nb,
 )(renumber)
@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+from contextlib import contextmanager
+from time import perf_counter
+
+from utz import err
+
+# Imported first by `juq.main`, so that time spent importing juq (and its dependencies) can be reported.
+START = perf_counter()
+
+# With -j/--jobs, cells are parsed, transformed, and serialized in worker processes, which is reported as "parallel"
+PHASES = ('import', 'read', 'parse', 'transform', 'serialize', 'parallel', 'write')
+
+enabled = False
+timings: dict[str, float] = {}
+# Time spent in nested phases, for each open phase (so that each phase's time excludes its sub-phases')
+_nested: list[float] = []
+
+
+def enable():
+    """Start accumulating per-phase timings (see :func:`phase`)."""
+    global enabled
+    enabled = True
+    timings.clear()
+    timings['import'] = perf_counter() - START
+
+
+@contextmanager
+def phase(name: str):
+    """Accumulate wall-clock time spent in this block under ``name`` (no-op unless :func:`enable` was called).
+
+    Phases can nest; time spent in an inner phase is only attributed to the inner phase.
+    """
+    if not enabled:
+        yield
+        return
+    t0 = perf_counter()
+    _nested.append(0.)
+    try:
+        yield
+    finally:
+        elapsed = perf_counter() - t0
+        timings[name] = timings.get(name, 0.) + elapsed - _nested.pop()
+        if _nested:
+            _nested[-1] += elapsed
+
+
+def peak_rss() -> int | None:
+    """Peak resident set size of this process, in bytes (None where unsupported, e.g. Windows)."""
+    try:
+        from resource import getrusage, RUSAGE_SELF
+    except ImportError:
+        return None
+    from sys import platform
+    rss = getrusage(RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return rss if platform == 'darwin' else rss * 1024
+
+
+def report(label: str):
+    """Log accumulated phase timings (plus any unattributed time, and peak RSS) to stderr."""
+    total = perf_counter() - START
+    names = [*PHASES, *(name for name in timings if name not in PHASES)]
+    pcs = [
+        f'{name} {timings[name]:.3f}s'
+        for name in names
+        if name in timings
+    ]
+    other = total - sum(timings.values())
+    pcs.append(f'other {other:.3f}s')
+    pcs.append(f'total {total:.3f}s')
+    rss = peak_rss()
+    if rss is not None:
+        pcs.append(f'peak RSS {rss / 2**20:.1f}MiB')
+    err(f'{label}: {", ".join(pcs)}')
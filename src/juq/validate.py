@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import lru_cache
+from os.path import dirname, exists, join
+from typing import Callable
+
+from click import argument, option
+from utz import decos, err
+
+from juq.cli import cli
+from juq.io import load_nb
+
+
+class ValidationError(ValueError):
+    """Raised when a notebook doesn't match the nbformat (v4.x) JSON schema."""
+    pass
+
+
+def schema_path(minor: int) -> str:
+    """Path to nbformat's JSON schema for v4.``minor`` (falling back to the latest v4 schema, for newer minors)."""
+    import nbformat
+    schema_dir = join(dirname(nbformat.__file__), 'v4')
+    path = join(schema_dir, f'nbformat.v4.{minor}.schema.json')
+    return path if exists(path) else join(schema_dir, 'nbformat.v4.schema.json')
+
+
+@lru_cache
+def validator(minor: int) -> Callable[[dict], dict]:
+    """Compile the nbformat v4.``minor`` schema to specialized Python code (via ``fastjsonschema``), once per process.
+
+    ``nbformat.validate`` interprets the schema with ``jsonschema`` (by default), re-resolving ``$ref``s and ``oneOf``
+    branches for every cell and output, which is a few times slower on large notebooks.
+    """
+    import fastjsonschema
+    with open(schema_path(minor), 'r') as f:
+        schema = json.load(f)
+    return fastjsonschema.compile(schema)
+
+
+def validate_nb(nb: dict) -> dict:
+    """Validate a notebook against the nbformat v4.x schema (for its ``nbformat_minor``); raise ValidationError if
+    invalid."""
+    from fastjsonschema import JsonSchemaException
+    if not isinstance(nb, dict):
+        raise ValidationError(f"Expected a JSON object, got {type(nb).__name__}")
+    major = nb.get('nbformat')
+    if major != 4:
+        raise ValidationError(f"Unsupported nbformat version: {major} (expected 4)")
+    minor = nb.get('nbformat_minor', 0)
+    try:
+        validator(minor)(nb)
+    except JsonSchemaException as e:
+        raise ValidationError(e.message) from None
+    # Cell ids (v4.5+) must also be unique, which the schema can't express
+    ids = set()
+    for idx, cell in enumerate(nb['cells']):
+        cell_id = cell.get('id')
+        if cell_id is None:
+            continue
+        if cell_id in ids:
+            raise ValidationError(f"data.cells[{idx}]: duplicate cell id {cell_id!r}")
+        ids.add(cell_id)
+    return nb
+
+
+def validate_path(path: str | None) -> str | None:
+    """Validate a notebook file (or stdin); return an error message if it's invalid (or can't be parsed)."""
+    try:
+        nb, _, _ = load_nb(path)
+        validate_nb(nb)
+    except (ValueError, OSError) as e:
+        # Includes ``ValidationError``s and JSON decode errors
+        return f"{type(e).__name__}: {e}"
+    return None
+
+
+def validate(
+    nb_paths: tuple[str, ...],
+    fail_fast: bool = False,
+    jobs: int | None = None,
+    quiet: bool = False,
+):
+    """Validate notebooks against the nbformat v4.x JSON schema.
+
+    Invalid notebooks are logged to stderr, and the exit status is 1 if any were found. Notebooks are validated in
+    parallel (-j), by a precompiled validator.
+    """
+    paths = list(nb_paths) or [None]
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+    jobs = min(jobs, len(paths))
+
+    def name(path):
+        return path or '<stdin>'
+
+    errors = {}
+    if jobs <= 1:
+        for path in paths:
+            error = validate_path(path)
+            if error:
+                err(f"{name(path)}: {error}")
+                errors[path] = error
+                if fail_fast:
+                    break
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            futures = { executor.submit(validate_path, path): path for path in paths }
+            for future in as_completed(futures):
+                path = futures[future]
+                error = future.result()
+                if error:
+                    err(f"{name(path)}: {error}")
+                    errors[path] = error
+                    if fail_fast:
+                        for future in futures:
+                            future.cancel()
+                        break
+
+    if errors:
+        if not fail_fast:
+            err(f"{len(errors)} of {len(paths)} notebook(s) invalid")
+        sys.exit(1)
+    elif not quiet:
+        err(f"{len(paths)} notebook(s) valid")
+
+
+validate_cmd = decos(
+    cli.command('validate'),
+    option('-j', '--jobs', type=int, help='Number of worker processes (default: number of CPUs)'),
+    option('-q', '--quiet', is_flag=True, help="Don't log a summary when all notebooks are valid"),
+    option('-x', '--fail-fast', is_flag=True, help='Exit at the first invalid notebook'),
+    argument('nb_paths', nargs=-1),
+)(validate)
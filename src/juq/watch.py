@@ -0,0 +1,175 @@
+from __future__ import annotations
+
+import ctypes
+import ctypes.util
+import os
+import struct
+from os.path import abspath, isdir, join
+from select import select
+from time import sleep
+from typing import Iterator
+
+from utz import err
+
+NB_EXTENSIONS = ('.ipynb', '.ipynb.gz', '.ipynb.zst')
+IGNORE_DIRS = {'.git', '.ipynb_checkpoints'}
+
+# Editors often save in bursts (truncate+write, or write temp file + rename); wait for this long without further
+# events before (re-)processing the affected notebooks.
+DEBOUNCE = 0.3
+POLL_INTERVAL = 1.
+
+# From <sys/inotify.h>
+IN_CLOSE_WRITE = 0x8
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+IN_Q_OVERFLOW = 0x4000
+IN_ISDIR = 0x40000000
+IN_CLOEXEC = os.O_CLOEXEC
+EVENT_HEADER = struct.Struct('iIII')
+
+
+def is_nb(path: str) -> bool:
+    return path.endswith(NB_EXTENSIONS)
+
+
+def walk_dirs(root: str) -> Iterator[str]:
+    for dir, dirs, _ in os.walk(root):
+        dirs[:] = [ d for d in dirs if d not in IGNORE_DIRS ]
+        yield dir
+
+
+def scan_nbs(root: str) -> dict[str, tuple[int, int]]:
+    """Map each notebook under ``root`` to its (mtime, size)."""
+    stats = {}
+    for dir, dirs, files in os.walk(root):
+        dirs[:] = [ d for d in dirs if d not in IGNORE_DIRS ]
+        for file in files:
+            if is_nb(file):
+                path = join(dir, file)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                stats[path] = (st.st_mtime_ns, st.st_size)
+    return stats
+
+
+class Inotify:
+    """Minimal recursive inotify watcher (Linux), via ctypes."""
+
+    MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+
+    def __init__(self, root: str):
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.libc = libc
+        self.fd = libc.inotify_init1(IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self.dirs = {}
+        for dir in walk_dirs(root):
+            self.add_watch(dir)
+
+    def add_watch(self, dir: str):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(dir), self.MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f'inotify_add_watch failed: {dir}')
+        self.dirs[wd] = dir
+
+    def read(self, timeout: float | None) -> list[str] | None:
+        """Return paths written/moved/created within the next ``timeout`` seconds (None on timeout)."""
+        readable, _, _ = select([self.fd], [], [], timeout)
+        if not readable:
+            return None
+        buf = os.read(self.fd, 1 << 16)
+        paths = []
+        pos = 0
+        while pos < len(buf):
+            wd, mask, _, size = EVENT_HEADER.unpack_from(buf, pos)
+            pos += EVENT_HEADER.size
+            name = os.fsdecode(buf[pos:pos + size].rstrip(b'\0'))
+            pos += size
+            if mask & IN_Q_OVERFLOW:
+                err("inotify queue overflowed; some changes may have been missed")
+                continue
+            dir = self.dirs.get(wd)
+            if dir is None:
+                continue
+            path = join(dir, name)
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO) and name not in IGNORE_DIRS:
+                    for subdir in walk_dirs(path):
+                        self.add_watch(subdir)
+                    paths += scan_nbs(path)
+            elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                paths.append(path)
+        return paths
+
+    def close(self):
+        os.close(self.fd)
+
+
+def _inotify_batches(root: str, debounce: float) -> Iterator[list[str]]:
+    inotify = Inotify(root)
+    try:
+        while True:
+            batch = dict.fromkeys(inotify.read(None) or [])
+            while True:
+                paths = inotify.read(debounce)
+                if paths is None:
+                    break
+                batch.update(dict.fromkeys(paths))
+            yield [ path for path in batch if is_nb(path) ]
+    finally:
+        inotify.close()
+
+
+def _poll_batches(root: str, interval: float) -> Iterator[list[str]]:
+    stats = scan_nbs(root)
+    pending = {}
+    while True:
+        sleep(interval)
+        cur = scan_nbs(root)
+        # Report notebooks whose stats changed, once they've been stable for a full interval
+        batch = [
+            path
+            for path, stat in pending.items()
+            if cur.get(path) == stat
+        ]
+        pending = {
+            path: stat
+            for path, stat in cur.items()
+            if stat != stats.get(path) and path not in batch
+        }
+        for path in batch:
+            stats[path] = cur[path]
+        for path in list(stats):
+            if path not in cur:
+                del stats[path]
+        if batch:
+            yield batch
+
+
+def watch_nbs(
+    root: str,
+    debounce: float = DEBOUNCE,
+    poll_interval: float = POLL_INTERVAL,
+    poll: bool | None = None,
+) -> Iterator[list[str]]:
+    """Yield batches of notebook paths under directory ``root`` that have been written to.
+
+    Uses inotify where available (Linux), otherwise polls file stats every ``poll_interval`` seconds (also forced by
+    ``poll=True``, or $JUQ_WATCH_POLL=1, e.g. for network filesystems). Either way, bursts of writes are debounced.
+    """
+    root = abspath(root)
+    if not isdir(root):
+        raise ValueError(f"Not a directory: {root}")
+    if poll is None:
+        poll = os.environ.get('JUQ_WATCH_POLL', '') not in ('', '0')
+    if not poll:
+        try:
+            yield from _inotify_batches(root, debounce)
+            return
+        except (OSError, AttributeError) as e:
+            err(f"inotify unavailable ({e}), polling for changes")
+    yield from _poll_batches(root, poll_interval)
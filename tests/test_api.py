@@ -0,0 +1,59 @@
+import gzip
+import json
+from concurrent.futures import ThreadPoolExecutor
+from copy import deepcopy
+from os.path import join
+from subprocess import check_output
+
+import pytest
+
+from juq import api
+from tests.utils import MERGE_OUTPUTS_DIR, TEST_DIR, read_bytes
+
+NB_PATHS = [
+    join(TEST_DIR, 'mixed-tags.ipynb'),
+    join(TEST_DIR, 'test-renumber.ipynb'),
+    join(MERGE_OUTPUTS_DIR, 'split-outputs.ipynb'),
+]
+
+CASES = [
+    (['nb', 'fmt', '-O'], lambda nb: api.fmt(nb, outputs=False)),
+    (['nb', 'fmt', '-s', '-o', '-n', '2'], lambda nb: api.fmt(nb, sources=True, outputs=True, indent=2)),
+    (['nb', 'clean', '-D', '-K'], lambda nb: api.clean(nb, keep_ids=False, keep_tags=False)),
+    (['nb', 'clean'], api.clean),
+    (['nb', 'clean', '-D'], lambda nb: api.clean(nb, keep_ids=False)),
+    (['nb', 'fmt'], api.fmt),
+    (['merge-outputs'], api.merge_outputs),
+    (['merge-outputs', '-T'], lambda nb: api.merge_outputs(nb, trailing_newline=False)),
+    (['renumber', '-q'], api.renumber),
+    (['cells', '-s', '0'], lambda nb: api.cells(nb, '0', source=True)),
+    (['cells', '-t', 'c', '-M', '1:'], lambda nb: api.cells(nb, '1:', cell_type='c', metadata=False)),
+    (['cells', '-s', '0,:2,-1'], lambda nb: api.cells(nb, '0,:2,-1', source=True)),
+]
+
+
+@pytest.mark.parametrize('nb_path', NB_PATHS)
+@pytest.mark.parametrize('args,fn', CASES)
+def test_api_matches_cli(nb_path, args, fn):
+    expected = check_output(['juq', *args, nb_path]).decode()
+    nb_bytes = read_bytes(nb_path)
+    assert fn(nb_bytes) == expected
+    assert fn(nb_bytes.decode()) == expected
+    assert fn(gzip.compress(nb_bytes)) == expected
+
+
+def test_api_dict_input_not_mutated():
+    nb = json.loads(read_bytes(join(TEST_DIR, 'test-renumber.ipynb')))
+    orig = deepcopy(nb)
+    out = api.renumber(nb)
+    assert nb == orig
+    assert out == json.dumps(json.loads(out), indent=1, ensure_ascii=False) + '\n'
+
+
+def test_api_threads():
+    nb_bytes = read_bytes(join(MERGE_OUTPUTS_DIR, 'split-outputs.ipynb'))
+    expected = read_bytes(join(MERGE_OUTPUTS_DIR, 'merged-outputs.ipynb'))
+    with ThreadPoolExecutor(8) as pool:
+        results = list(pool.map(lambda _: api.merge_outputs(nb_bytes), range(32)))
+    assert all(json.loads(r) == json.loads(expected) for r in results)
+    assert len(set(results)) == 1
@@ -0,0 +1,82 @@
+import json
+from os import listdir
+from os.path import join
+from subprocess import check_output
+from tempfile import TemporaryDirectory
+
+import pytest
+
+from juq import api
+from juq.blobs import BLOB_PREFIX, blob_ref, externalize, rehydrate
+
+PNG = 'iVBORw0KGgo' + 'A' * 8000 + '\n'
+
+
+def make_nb():
+    return {
+        'cells': [
+            {
+                'cell_type': 'code',
+                'execution_count': 1,
+                'id': 'code',
+                'metadata': {},
+                'outputs': [
+                    {'output_type': 'display_data', 'data': {'image/png': PNG, 'text/plain': ['<Figure>']}, 'metadata': {}},
+                    {
+                        'output_type': 'execute_result',
+                        'execution_count': 1,
+                        'data': {'application/json': {'k': 'v' * 5000}, 'text/html': ['<b>\n'] * 2000, 'text/plain': ['x' * 5000]},
+                        'metadata': {},
+                    },
+                    {'output_type': 'display_data', 'data': {'image/png': 'small'}, 'metadata': {}},
+                ],
+                'source': 'plot()',
+            },
+            {
+                'cell_type': 'markdown',
+                'id': 'md',
+                'metadata': {},
+                'attachments': {'a.png': {'image/png': PNG}},
+                'source': '![a](attachment:a.png)',
+            },
+        ],
+        'metadata': {},
+        'nbformat': 4,
+        'nbformat_minor': 5,
+    }
+
+
+def test_externalize_rehydrate():
+    nb = make_nb()
+    with TemporaryDirectory() as store:
+        ext = externalize(make_nb(), store)
+        [code, md] = ext['cells']
+        [fig, result, small] = code['outputs']
+        assert fig['data']['image/png'].startswith(BLOB_PREFIX)
+        assert fig['data']['text/plain'] == ['<Figure>']
+        assert blob_ref(result['data']['application/json']) is not None
+        assert blob_ref(result['data']['text/html']) is not None
+        assert result['data']['text/plain'] == ['x' * 5000]
+        assert small['data']['image/png'] == 'small'
+        # Identical payloads are stored once
+        assert md['attachments']['a.png']['image/png'] == fig['data']['image/png']
+        assert sum(len(listdir(join(store, d))) for d in listdir(store)) == 3
+
+        assert rehydrate(ext, store) == nb
+
+
+def test_rehydrate_missing_blob():
+    with TemporaryDirectory() as store:
+        ext = externalize(make_nb(), store)
+    with TemporaryDirectory() as empty_store, pytest.raises(FileNotFoundError):
+        rehydrate(ext, empty_store)
+
+
+def test_fmt_externalize_cli():
+    nb_str = api.fmt(make_nb())
+    with TemporaryDirectory() as store:
+        ext_str = check_output(['juq', 'nb', 'fmt', '-x', store], input=nb_str.encode()).decode()
+        assert len(ext_str) < len(nb_str) / 5
+        assert api.fmt(ext_str, externalize_dir=store) == ext_str
+        assert check_output(['juq', 'nb', 'fmt', '-X', store], input=ext_str.encode()).decode() == nb_str
+        assert json.loads(api.fmt(ext_str, rehydrate_dir=store)) == make_nb()
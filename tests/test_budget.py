@@ -0,0 +1,94 @@
+import json
+from subprocess import check_output
+
+import pytest
+
+from juq import api
+from juq.budget import budget_outputs, fit_output, json_size, truncate_text
+
+LOG = ''.join(f'line {i}\n' for i in range(1000))
+STREAM = {'output_type': 'stream', 'name': 'stdout', 'text': LOG}
+FIGURE = {
+    'output_type': 'display_data',
+    'data': {'image/png': 'A' * 10000, 'text/plain': ['<Figure size 640x480 with 1 Axes>']},
+    'metadata': {'image/png': {'width': 640}},
+}
+IMAGE = {'output_type': 'display_data', 'data': {'image/png': 'A' * 10000}, 'metadata': {}}
+
+
+def make_nb(*cells_outputs):
+    return {
+        'cells': [
+            {'cell_type': 'code', 'execution_count': 1, 'metadata': {}, 'source': 'x', 'outputs': list(outputs)}
+            for outputs in cells_outputs
+        ],
+        'metadata': {},
+        'nbformat': 4,
+        'nbformat_minor': 5,
+    }
+
+
+def test_truncate_text():
+    assert truncate_text(LOG, len(LOG)) == LOG
+    truncated = truncate_text(LOG, 200)
+    assert len(truncated) <= 200
+    assert truncated.startswith('line 0\nline 1\n')
+    assert truncated.endswith('line 998\nline 999\n')
+    head, tail = truncated.split('[… juq: truncated ')
+    n, tail = tail.split(' bytes …]\n')
+    assert len(head) + int(n) + len(tail) == len(LOG)
+    # Too small for the marker
+    assert truncate_text(LOG, 10) is None
+
+
+def test_fit_output():
+    assert fit_output(STREAM, 10**6) is STREAM
+    stream = fit_output(STREAM, 500)
+    assert json_size(stream) <= 500
+    assert stream['text'].startswith('line 0\n')
+
+    figure = fit_output(FIGURE, 500)
+    assert figure == {**FIGURE, 'data': {'text/plain': FIGURE['data']['text/plain']}, 'metadata': {}}
+
+    image = fit_output(IMAGE, 500)
+    assert image['data'] == {'text/plain': f'[juq: dropped image/png output ({json_size(IMAGE)} bytes)]'}
+    assert fit_output(IMAGE, 500, oversize='drop') is None
+
+    # No room for a truncation marker
+    assert fit_output(STREAM, 60)['text'] == f'[juq: dropped stdout output ({json_size(STREAM)} bytes)]'
+    assert fit_output(STREAM, 60, oversize='drop') is None
+
+
+def test_budget_outputs():
+    nb = budget_outputs(make_nb([STREAM, IMAGE], [STREAM]), max_cell_bytes=3000, max_nb_bytes=4000)
+    [cell0, cell1] = nb['cells']
+    assert json_size(cell0['outputs'][0]) <= 3000
+    # The rest of cell 0's budget doesn't fit the image, and the notebook budget leaves ≈1000 bytes for cell 1
+    assert cell0['outputs'][1]['data']['text/plain'].startswith('[juq: dropped image/png')
+    assert 800 < json_size(cell1['outputs'][0]) <= 1000
+
+
+def test_fmt_budget_cli():
+    nb = make_nb([STREAM, FIGURE, IMAGE])
+    out = check_output(
+        ['juq', 'nb', 'fmt', '--max-output-size', '1k', '--oversize', 'drop'],
+        input=json.dumps(nb).encode(),
+    )
+    [cell] = json.loads(out)['cells']
+    assert [ o['output_type'] for o in cell['outputs'] ] == ['stream', 'display_data']
+    assert all(json_size(o) <= 1000 for o in cell['outputs'])
+
+
+@pytest.mark.parametrize('kwargs', [
+    {'max_output_size': 500},
+    {'max_output_size': 60},
+    {'max_cell_output_size': 800},
+    {'max_nb_output_size': 3000},
+    {'max_nb_output_size': 3000, 'oversize': 'drop'},
+])
+def test_budget_idempotent(kwargs):
+    """Budgeted notebooks are a fixed point (so e.g. `nb fmt -w --max-…` works as a pre-commit hook)."""
+    nb = json.dumps(make_nb([STREAM, STREAM, FIGURE], [IMAGE, STREAM], [STREAM]))
+    once = api.fmt(nb, **kwargs)
+    assert once != api.fmt(nb)
+    assert api.fmt(once, **kwargs) == once
@@ -0,0 +1,53 @@
+import json
+from os import listdir
+from os.path import join
+from subprocess import check_output, run
+from tempfile import TemporaryDirectory
+
+from juq import api
+from tests.utils import TEST_DIR, read_text
+
+NB_PATH = join(TEST_DIR, 'test-renumber.ipynb')
+
+
+def test_multiple_slices():
+    nb = read_text(NB_PATH)
+    out = check_output(['juq', 'cells', '-s', '0,1:3,3', NB_PATH]).decode()
+    assert out == api.cells(nb, '0', source=True) + api.cells(nb, '1:3', source=True) + api.cells(nb, '3', source=True)
+
+
+def test_split_to_dir():
+    nb = read_text(NB_PATH)
+    with TemporaryDirectory() as tmpdir:
+        split_dir = join(tmpdir, 'cells')
+        check_output(['juq', 'cells', '-s', '-d', split_dir, '0,1,2:4', NB_PATH])
+        assert sorted(listdir(split_dir)) == ['0.md', '1.py', '2-4.json']
+        assert read_text(join(split_dir, '0.md')) == api.cells(nb, '0', source=True)
+        assert read_text(join(split_dir, '1.py')) == 'num = 111\n'
+        assert json.loads(read_text(join(split_dir, '2-4.json'))) == ['Some more markdown', 'print(f"{num=}")\nnum * num']
+
+
+def test_split_to_template():
+    nb = read_text(NB_PATH)
+    with TemporaryDirectory() as tmpdir:
+        template = join(tmpdir, 'out', 'cell-{i}-{slice}.{ext}')
+        check_output(['juq', 'cells', '-t', 'c', '-o', '-d', template, '1,-2:', NB_PATH])
+        assert sorted(listdir(join(tmpdir, 'out'))) == ['cell-0-1.json', 'cell-1--2-.json']
+        assert read_text(join(tmpdir, 'out', 'cell-0-1.json')) == api.cells(nb, '1', cell_type='c', outputs=True)
+        assert read_text(join(tmpdir, 'out', 'cell-1--2-.json')) == api.cells(nb, '-2:', cell_type='c', outputs=True)
+
+
+def test_split_to_errors():
+    with TemporaryDirectory() as tmpdir:
+        # Each slice would overwrite the previous one's file
+        proc = run(['juq', 'cells', '-s', '-d', join(tmpdir, 'cell.{ext}'), '0,1', NB_PATH], capture_output=True, text=True)
+        assert proc.returncode != 0
+        assert 'no {i} or {slice} field' in proc.stderr
+        # Each notebook would overwrite the previous one's files
+        proc = run(['juq', 'cells', '--stream', '-s', '-d', tmpdir, '0,1'], input=read_text(NB_PATH), capture_output=True, text=True)
+        assert proc.returncode != 0
+        assert '-d/--split-to is not supported with --stream' in proc.stderr
+        assert listdir(tmpdir) == []
+        # A single slice can go to a fixed path
+        check_output(['juq', 'cells', '-s', '-d', join(tmpdir, 'cell.{ext}'), '1', NB_PATH])
+        assert read_text(join(tmpdir, 'cell.py')) == 'num = 111\n'
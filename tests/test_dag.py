@@ -0,0 +1,83 @@
+import json
+from os import utime
+from os.path import exists, join
+from subprocess import run
+from tempfile import TemporaryDirectory
+
+import pytest
+
+from juq.papermill.dag import NbNode, build_dag, is_stale, load_node
+from tests.utils import read_text
+
+
+def write_nb(path, source, inputs=(), outputs=()):
+    nb = {
+        'cells': [{'cell_type': 'code', 'execution_count': None, 'id': 'cell', 'metadata': {}, 'outputs': [], 'source': source}],
+        'metadata': {
+            'juq': {'inputs': list(inputs), 'outputs': list(outputs)},
+            'kernelspec': {'display_name': 'Python 3', 'language': 'python', 'name': 'python3'},
+            'language_info': {'name': 'python'},
+        },
+        'nbformat': 4,
+        'nbformat_minor': 5,
+    }
+    with open(path, 'w') as f:
+        json.dump(nb, f, indent=1)
+
+
+def test_build_dag():
+    a = NbNode('/a.ipynb', outputs=['/a.txt'])
+    b = NbNode('/b.ipynb', inputs=['/a.txt', '/raw.txt'], outputs=['/b.txt'])
+    c = NbNode('/c.ipynb', inputs=['/a.txt', '/b.txt'])
+    assert build_dag([a, b, c]) == {'/a.ipynb': set(), '/b.ipynb': {'/a.ipynb'}, '/c.ipynb': {'/a.ipynb', '/b.ipynb'}}
+    a.inputs = ['/b.txt']
+    with pytest.raises(ValueError, match='cycle'):
+        build_dag([a, b, c])
+
+
+def test_is_stale():
+    with TemporaryDirectory() as tmpdir:
+        nb_path = join(tmpdir, 'nb.ipynb')
+        write_nb(nb_path, '', inputs=['in.txt'], outputs=['out.txt'])
+        node = load_node(nb_path)
+        assert node.inputs == [join(tmpdir, 'in.txt')]
+        assert is_stale(node)
+        for name, mtime in [('in.txt', 1000), ('out.txt', 2000), ('nb.ipynb', 1500)]:
+            path = join(tmpdir, name)
+            open(path, 'a').close()
+            utime(path, (mtime, mtime))
+        assert not is_stale(node)
+        utime(join(tmpdir, 'in.txt'), (3000, 3000))
+        assert is_stale(node)
+
+
+def test_run_dag():
+    with TemporaryDirectory() as tmpdir:
+        write_nb(join(tmpdir, 'a.ipynb'), "open('a.txt', 'w').write('A')", outputs=['a.txt'])
+        write_nb(join(tmpdir, 'b.ipynb'), "open('b.txt', 'w').write(open('a.txt').read() + 'B')", inputs=['a.txt'], outputs=['b.txt'])
+        write_nb(join(tmpdir, 'c.ipynb'), "raise ValueError('boom')", outputs=['c.txt'])
+        write_nb(join(tmpdir, 'd.ipynb'), "open('d.txt', 'w').write('D')", inputs=['c.txt'], outputs=['d.txt'])
+        nb_paths = [ join(tmpdir, f'{name}.ipynb') for name in 'abcd' ]
+
+        proc = run(['juq', 'nb', 'dag', '-j2', *nb_paths], capture_output=True, text=True)
+        assert proc.returncode != 0
+        assert 'Skipping' in proc.stderr and 'd.ipynb (upstream failure)' in proc.stderr
+        assert read_text(join(tmpdir, 'b.txt')) == 'AB'
+        assert not exists(join(tmpdir, 'd.txt'))
+        b_nb = json.loads(read_text(join(tmpdir, 'b.ipynb')))
+        assert b_nb['cells'][0]['execution_count'] == 1
+
+        proc = run(['juq', 'nb', 'dag', *nb_paths[:2]], capture_output=True, text=True, check=True)
+        assert 'Up to date: ' in proc.stderr and 'Running' not in proc.stderr
+
+
+def test_rerun_after_failure():
+    """A notebook that writes its output and then fails stays stale, so it's re-run (and fails again)."""
+    with TemporaryDirectory() as tmpdir:
+        nb_path = join(tmpdir, 'c.ipynb')
+        write_nb(nb_path, "open('c.txt', 'w').write('C')\nraise ValueError('boom')", outputs=['c.txt'])
+        for _ in range(2):
+            proc = run(['juq', 'nb', 'dag', nb_path], capture_output=True, text=True)
+            assert proc.returncode == 1
+            assert 'Up to date' not in proc.stderr
+            assert exists(join(tmpdir, 'c.txt'))
@@ -0,0 +1,83 @@
+import json
+from os.path import join
+from tempfile import TemporaryDirectory
+
+import pytest
+
+from juq.papermill.engine import append_text, collapse_cr
+from juq.papermill.run import papermill_run
+
+PROGRESS_SRC = '\n'.join([
+    "for i in range(100):",
+    "    print(f'\\rprogress {i}', end='', flush=True)",
+    "print()",
+    "print('done')",
+])
+
+
+def append_all(texts, collapse=False):
+    chunks = []
+    for text in texts:
+        append_text(chunks, text, collapse=collapse)
+    return chunks
+
+
+@pytest.mark.parametrize('text,expected', [
+    ('abc', 'abc'),
+    ('abc\rde', 'de'),
+    ('abc\rdef\rg\n', 'g\n'),
+    ('abc\r\ndef\r', 'abc\r\ndef\r'),
+    ('a\rb\nc\rd\n', 'b\nd\n'),
+])
+def test_collapse_cr(text, expected):
+    assert collapse_cr(text) == expected
+
+
+def test_append_text():
+    texts = [ f'{i}\n' for i in range(1000) ]
+    chunks = append_all(texts)
+    assert ''.join(chunks) == ''.join(texts)
+    assert len(chunks) <= 20
+
+
+def test_append_text_collapse():
+    texts = [ f'\rprogress {i}' for i in range(1000) ] + ['\n', 'done\n', 'a\rb']
+    chunks = append_all(texts, collapse=True)
+    assert ''.join(chunks) == 'progress 999\ndone\nb'
+    assert ''.join(chunks) == collapse_cr(''.join(texts))
+
+
+def run_progress_nb(**kwargs):
+    nb = {
+        'cells': [{
+            'cell_type': 'code',
+            'execution_count': None,
+            'id': 'progress',
+            'metadata': {},
+            'outputs': [],
+            'source': PROGRESS_SRC,
+        }],
+        'metadata': {'kernelspec': {'display_name': 'Python 3', 'language': 'python', 'name': 'python3'}},
+        'nbformat': 4,
+        'nbformat_minor': 5,
+    }
+    with TemporaryDirectory() as tmpdir:
+        nb_path = join(tmpdir, 'progress.ipynb')
+        with open(nb_path, 'w') as f:
+            json.dump(nb, f)
+        nb, exc = papermill_run(nb_path, **kwargs)
+    assert exc is None
+    return [
+        (output['name'], ''.join(output['text']))
+        for output in nb['cells'][0]['outputs']
+    ]
+
+
+def test_run_coalesce_streams():
+    expected_progress = ''.join(f'\rprogress {i}' for i in range(100)) + '\n'
+    outputs = run_progress_nb()
+    assert outputs == run_progress_nb(coalesce_streams=False)
+    assert outputs == [('stdout', expected_progress + 'done\n')]
+    assert run_progress_nb(collapse_cr=True) == [('stdout', 'progress 99\ndone\n')]
+    with pytest.raises(ValueError):
+        run_progress_nb(coalesce_streams=False, collapse_cr=True)
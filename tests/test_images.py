@@ -0,0 +1,120 @@
+import json
+import zlib
+from base64 import b64decode, b64encode
+from os import listdir
+from os.path import join
+from subprocess import check_call
+from tempfile import TemporaryDirectory
+
+import pytest
+
+from juq import images
+from juq.images import PNG_SIGNATURE, optimize_images, optimize_png, png_chunk, png_chunks
+
+
+def make_png(width=200, height=150, level=1, idat_size=1000):
+    """A "plot" (white background, a few colored lines), compressed quickly and split over several IDAT chunks."""
+    rows = []
+    for y in range(height):
+        row = bytearray(b'\xff' * (3 * width))
+        for x in range(width):
+            if x == y or x == 2 * y or y == height // 2:
+                row[3 * x:3 * x + 3] = bytes([x % 256, 0, 200])
+        rows.append(b'\x00' + bytes(row))
+    idat = zlib.compress(b''.join(rows), level)
+    ihdr = width.to_bytes(4, 'big') + height.to_bytes(4, 'big') + bytes([8, 2, 0, 0, 0])
+    return b''.join([
+        PNG_SIGNATURE,
+        png_chunk(b'IHDR', ihdr),
+        png_chunk(b'tEXt', b'Software\x00juq-tests'),
+        *(png_chunk(b'IDAT', idat[i:i + idat_size]) for i in range(0, len(idat), idat_size)),
+        png_chunk(b'IEND', b''),
+    ])
+
+
+def pixels(data):
+    chunks = png_chunks(data)
+    return (
+        zlib.decompress(b''.join(d for t, d in chunks if t == b'IDAT')),
+        [ (t, d) for t, d in chunks if t != b'IDAT' ],
+    )
+
+
+def image_nb(png):
+    b64 = b64encode(png).decode()
+    return {
+        'cells': [
+            {
+                'cell_type': 'code',
+                'execution_count': 1,
+                'id': 'plot',
+                'metadata': {},
+                'outputs': [
+                    {'data': {'image/png': b64 + '\n', 'text/plain': ['<Figure>']}, 'metadata': {}, 'output_type': 'display_data'},
+                    {'data': {'image/png': 'not base64 PNG data'}, 'metadata': {}, 'output_type': 'display_data'},
+                ],
+                'source': 'plot()',
+            },
+            {
+                'attachments': {'plot.png': {'image/png': [b64[:100], b64[100:]]}},
+                'cell_type': 'markdown',
+                'id': 'md',
+                'metadata': {},
+                'source': '![](attachment:plot.png)',
+            },
+        ],
+        'metadata': {},
+        'nbformat': 4,
+        'nbformat_minor': 5,
+    }
+
+
+def test_optimize_png():
+    png = make_png()
+    optimized = optimize_png(png)
+    assert len(optimized) < len(png)
+    assert pixels(optimized) == pixels(png)
+    assert [ t for t, _ in png_chunks(optimized) ] == [b'IHDR', b'tEXt', b'IDAT', b'IEND']
+    # Already optimized
+    assert optimize_png(optimized) is optimized
+    with pytest.raises(ValueError):
+        optimize_png(png[:-1])
+
+
+def test_optimize_images(monkeypatch):
+    png = make_png()
+    nb = image_nb(png)
+    with TemporaryDirectory() as cache:
+        out = optimize_images(json.loads(json.dumps(nb)), cache=cache)
+        [plot, invalid] = out['cells'][0]['outputs']
+        value = plot['data']['image/png']
+        assert value.endswith('\n')
+        optimized = b64decode(value)
+        assert len(optimized) < len(png)
+        assert pixels(optimized) == pixels(png)
+        assert invalid == nb['cells'][0]['outputs'][1]
+        assert out['cells'][1]['attachments']['plot.png']['image/png'] == value[:-1]
+        # Entries for the original image, the optimized one (which is final), and the invalid one
+        assert sum(len(listdir(join(cache, d))) for d in listdir(cache)) == 3
+
+        # Unchanged images are looked up in the cache, instead of recompressed
+        def fail(data):
+            raise AssertionError("Cache miss")
+        monkeypatch.setattr(images, 'optimize_png', fail)
+        assert optimize_images(json.loads(json.dumps(nb)), cache=cache) == out
+        assert optimize_images(json.loads(json.dumps(out)), cache=cache) == out
+
+
+def test_fmt_optimize_images():
+    with TemporaryDirectory() as tmpdir:
+        nb_path = join(tmpdir, 'plot.ipynb')
+        with open(nb_path, 'w') as f:
+            json.dump(image_nb(make_png()), f, indent=1)
+        cache = join(tmpdir, 'cache')
+        out_path = join(tmpdir, 'out.ipynb')
+        check_call(['juq', 'nb', 'fmt', '--optimize-images', '--image-cache', cache, nb_path, out_path])
+        with open(out_path, 'r') as f:
+            out = json.load(f)
+        assert out == optimize_images(image_nb(make_png()), cache=cache)
+        with open(nb_path, 'r') as f:
+            assert out != json.load(f)
@@ -0,0 +1,68 @@
+import gzip
+import json
+import sys
+from os.path import join
+from subprocess import check_output
+from tempfile import TemporaryDirectory
+
+import pytest
+
+from juq.cli import infer_nb_indent, write_nb
+from juq.io import load_nb, read_nb_ends, read_nb_str, sniff_compression
+from tests.utils import TEST_DIR, read_bytes
+
+NB_PATH = join(TEST_DIR, 'test-renumber-out.ipynb')
+
+
+def test_infer_nb_indent():
+    assert infer_nb_indent('{\n "cells": []\n}') == 1
+    assert infer_nb_indent('{\r\n  "cells": []\r\n}') == 2
+    assert infer_nb_indent('{"cells": []}') is None
+
+
+@pytest.mark.parametrize('ext,compression', [('.gz', 'gzip'), ('.zst', 'zstd')])
+def test_compressed_roundtrip(ext, compression):
+    if compression == 'zstd' and sys.version_info < (3, 14):
+        pytest.importorskip('zstandard')
+    expected = read_bytes(NB_PATH)
+    with TemporaryDirectory() as tmpdir:
+        out_path = join(tmpdir, f'out.ipynb{ext}')
+        check_output(['juq', 'renumber', '-q', NB_PATH, out_path])
+        compressed = read_bytes(out_path)
+        assert sniff_compression(compressed) == compression
+        assert len(compressed) < len(expected)
+        assert read_nb_str(out_path).encode() == expected
+
+        # Input compression is sniffed (stdin), output compression comes from `-z`
+        actual = check_output(['juq', 'merge-outputs', '-z', 'none'], input=compressed)
+        assert actual == expected
+
+        # In-place rewrites preserve compression, and are byte-for-byte reproducible (no gzip mtime)
+        check_output(['juq', 'renumber', '-q', '-i', out_path])
+        assert read_bytes(out_path) == compressed
+
+
+def test_write_nb_infers_from_compressed():
+    with TemporaryDirectory() as tmpdir:
+        out_path = join(tmpdir, 'out.ipynb.gz')
+        with gzip.open(out_path, 'wt') as f:
+            f.write('{\n    "cells": []\n}')
+        write_nb({'cells': [], 'metadata': {}}, out_path)
+        assert read_nb_str(out_path) == '{\n    "cells": [],\n    "metadata": {}\n}'
+
+
+def test_load_nb_mmap():
+    nb_str = read_bytes(NB_PATH).decode()
+    nb, head, tail = load_nb(NB_PATH)
+    assert nb == json.loads(nb_str)
+    assert nb_str.startswith(head) and nb_str.endswith(tail)
+    assert infer_nb_indent(head) == 1
+    assert read_nb_ends(NB_PATH) == (head, tail)
+
+    # Files redirected to stdin are mapped too; pipes and empty files fall back to reading
+    with open(NB_PATH, 'rb') as f:
+        assert check_output(['juq', 'merge-outputs'], stdin=f) == nb_str.encode()
+    with TemporaryDirectory() as tmpdir:
+        empty_path = join(tmpdir, 'empty.ipynb')
+        open(empty_path, 'w').close()
+        assert read_nb_ends(empty_path) == ('', '')
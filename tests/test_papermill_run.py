@@ -62,3 +62,73 @@ def test_mixed_tags_drop():
         "mixed-tags-drop.ipynb",
         keep_tags=False,
     )
+
+
+def test_partial_run():
+    """Only the last cell runs (after "parameters" cells); other cells keep their outputs (from a run with num=222)."""
+    in_path = join(TEST_DIR, 'mixed-tags-params-222.ipynb')
+    with open(in_path, 'r') as f:
+        expected = json.load(f)
+    expected['cells'][1]['source'] = ['# Parameters\n', 'num = 333\n']
+    with TemporaryDirectory() as tmpdir:
+        out_path = join(tmpdir, 'out.ipynb')
+        papermill_run_cmd.callback(in_path, out_path, cells_slice='-1:', parameter_strs=('num=333',))
+        with open(out_path, 'r') as f:
+            actual = json.load(f)
+    assert normalize_nb(actual) == normalize_nb(expected)
+
+
+def code_cell(source, outputs=(), execution_count=None):
+    return {
+        'cell_type': 'code',
+        'execution_count': execution_count,
+        'metadata': {},
+        'outputs': list(outputs),
+        'source': source,
+    }
+
+
+def stdout_output(text):
+    return {'name': 'stdout', 'output_type': 'stream', 'text': [text]}
+
+
+def run_until_error(**kwargs):
+    """Run a notebook whose 3rd cell raises, with -e/--until-error; return its code cells."""
+    with open(join(TEST_DIR, 'test-err.ipynb'), 'r') as f:
+        nb = json.load(f)
+    nb['cells'] = [
+        code_cell("print('a')", [stdout_output('old a\n')], 1),
+        code_cell("print('b')", [stdout_output('old b\n')], 2),
+        code_cell('raise ValueError("error")'),
+        code_cell("print('d')", [stdout_output('old d\n')], 3),
+    ]
+    for idx, cell in enumerate(nb['cells']):
+        cell['id'] = f'cell-{idx}'
+    with TemporaryDirectory() as tmpdir:
+        in_path = join(tmpdir, 'in.ipynb')
+        out_path = join(tmpdir, 'out.ipynb')
+        with open(in_path, 'w') as f:
+            json.dump(nb, f)
+        papermill_run_cmd.callback(in_path, out_path, until_error=True, **kwargs)
+        with open(out_path, 'r') as f:
+            actual = json.load(f)
+    return [ cell for cell in actual['cells'] if cell['cell_type'] == 'code' ]
+
+
+def test_partial_run_until_error():
+    cells = run_until_error(from_cell=1)
+    assert [ cell['execution_count'] for cell in cells ] == [1, 2, 3, 4]
+    assert cells[0]['outputs'] == [stdout_output('old a\n')]
+    assert cells[1]['outputs'] == [stdout_output('b\n')]
+    assert cells[2]['outputs'][0]['output_type'] == 'error'
+    assert cells[3]['outputs'] == [stdout_output('old d\n')]
+
+
+def test_until_error():
+    """Cells after the error keep their existing outputs, in full runs too."""
+    cells = run_until_error()
+    assert [ cell['execution_count'] for cell in cells ] == [1, 2, 3, 4]
+    assert cells[0]['outputs'] == [stdout_output('a\n')]
+    assert cells[1]['outputs'] == [stdout_output('b\n')]
+    assert cells[2]['outputs'][0]['output_type'] == 'error'
+    assert cells[3]['outputs'] == [stdout_output('old d\n')]
@@ -0,0 +1,78 @@
+import json
+from os.path import join
+from subprocess import check_output, run
+from tempfile import TemporaryDirectory
+
+import pytest
+
+from juq.parallel import split_cells
+from tests.utils import TEST_DIR
+
+NB_PATHS = [join(TEST_DIR, 'mixed-tags.ipynb'), join(TEST_DIR, 'test-renumber-out.ipynb')]
+CMDS = [
+    ['nb', 'fmt'],
+    ['nb', 'fmt', '-O', '-n', '2'],
+    ['nb', 'fmt', '-B', '-T', '--ensure-ascii'],
+    ['nb', 'fmt', '--max-output-size', '100'],
+    ['nb', 'clean', '-D'],
+    ['merge-outputs'],
+]
+
+
+def big_nb(num_cells=200):
+    """Notebook with many cells, whose strings contain JSON-like text (incl. escaped newlines and cell "separators")."""
+    cells = []
+    for idx in range(num_cells):
+        if idx % 3 == 0:
+            cells.append({'cell_type': 'markdown', 'id': f'md-{idx}', 'metadata': {}, 'source': [f'# Cell {idx} ü\n', 'a "b" \\ c']})
+            continue
+        cells.append({
+            'cell_type': 'code',
+            'execution_count': idx,
+            'id': f'code-{idx}',
+            'metadata': {'papermill': {'duration': 1.}, 'tags': [], 'cells': [{'nested': []}]},
+            'outputs': [
+                {'name': 'stdout', 'output_type': 'stream', 'text': [f'{idx} {j}\n' for j in range(idx % 7)]},
+                {'name': 'stdout', 'output_type': 'stream', 'text': ['\n  },\n  {\n']},
+            ],
+            'source': 'print("\\n  },\\n  {")',
+        })
+    return {'cells': cells, 'metadata': {'papermill': {}}, 'nbformat': 4, 'nbformat_minor': 5}
+
+
+@pytest.mark.parametrize('indent', [1, 2, 4])
+def test_split_cells(indent):
+    nb = big_nb()
+    data = json.dumps(nb, indent=indent).encode()
+    start, end, ranges = split_cells(data, indent, 8)
+    assert 1 < len(ranges) <= 8
+    assert ranges[0][0] == start and ranges[-1][1] == end
+    cells = []
+    for a, b in ranges:
+        cells += json.loads(b'[' + data[a:b] + b']')
+    assert cells == nb['cells']
+    assert split_cells(json.dumps(nb).encode(), 1, 8) is None
+    assert split_cells(json.dumps({ **nb, 'cells': [] }, indent=indent).encode(), indent, 8) is None
+
+
+@pytest.mark.parametrize('cmd', CMDS)
+def test_parallel_identical(cmd):
+    with TemporaryDirectory() as tmpdir:
+        paths = list(NB_PATHS)
+        for indent in [None, 1, 2]:
+            path = join(tmpdir, f'big-{indent}.ipynb')
+            with open(path, 'w') as f:
+                json.dump(big_nb(), f, indent=indent)
+            paths.append(path)
+        for path in paths:
+            expected = check_output(['juq', *cmd, path])
+            actual = check_output(['juq', *cmd, '-j', '2', path])
+            assert actual == expected, path
+
+
+def test_parallel_unsupported():
+    path = join(TEST_DIR, 'mixed-tags.ipynb')
+    for args in [['--max-nb-output-size', '1k'], ['--validate'], ['--stream']]:
+        proc = run(['juq', 'nb', 'fmt', '-j', '2', *args, path], capture_output=True, text=True)
+        assert proc.returncode != 0
+        assert '-j/--jobs' in proc.stderr
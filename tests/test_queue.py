@@ -0,0 +1,51 @@
+import json
+from os.path import join
+from subprocess import check_output, run
+from tempfile import TemporaryDirectory
+
+from juq.papermill.queue import add_job, claim_job, connect, finish_job
+from tests.utils import TEST_DIR, load_json, normalize_nb
+
+
+def test_leases():
+    with TemporaryDirectory() as tmpdir:
+        conn = connect(join(tmpdir, 'q.db'))
+        id1 = add_job(conn, 'a.ipynb', parameters={'n': 1}, max_attempts=2)
+        id2 = add_job(conn, 'b.ipynb', out_path='b-out.ipynb', max_attempts=1)
+
+        job1 = claim_job(conn, 'w1')
+        assert (job1['id'], job1['attempts'], job1['worker']) == (id1, 1, 'w1')
+        assert json.loads(job1['parameters']) == {'n': 1}
+        job2 = claim_job(conn, 'w2', lease=-1)  # lease expires immediately, as if "w2" died
+        assert job2['id'] == id2
+        # Job 2 has no attempts left, so it fails (instead of being leased again)
+        assert claim_job(conn, 'w3') is None
+        assert conn.execute('SELECT status FROM jobs WHERE id = ?', (id2,)).fetchone()[0] == 'failed'
+        # Job 1 fails, and is retried
+        assert finish_job(conn, job1, 'w1', 'Boom') == 'pending'
+        job1 = claim_job(conn, 'w3')
+        assert (job1['id'], job1['attempts'], job1['worker']) == (id1, 2, 'w3')
+        # A worker whose lease was taken over can't finish the job
+        assert finish_job(conn, job1, 'w1') is None
+        assert finish_job(conn, job1, 'w3') == 'done'
+        assert claim_job(conn, 'w3') is None
+        conn.close()
+
+
+def test_queue_work():
+    with TemporaryDirectory() as tmpdir:
+        db = join(tmpdir, 'q.db')
+        out_222 = join(tmpdir, 'out-222.ipynb')
+        out_333 = join(tmpdir, 'out-333.ipynb')
+        out_err = join(tmpdir, 'out-err.ipynb')
+        in_path = join(TEST_DIR, 'mixed-tags-params.ipynb')
+        check_output(['juq', 'nb', 'queue', 'add', '-p', 'num=222', '-o', out_222, db, in_path])
+        check_output(['juq', 'nb', 'queue', 'add', '-p', 'num=333', '-o', out_333, db, in_path])
+        check_output(['juq', 'nb', 'queue', 'add', '-r', '2', '-o', out_err, db, join(TEST_DIR, 'test-err.ipynb')])
+        proc = run(['juq', 'nb', 'queue', 'work', '-d', '-j', '2', '-P', '.1', db], capture_output=True, text=True)
+        assert proc.returncode == 1
+        assert normalize_nb(load_json(out_222)) == normalize_nb(load_json(join(TEST_DIR, 'mixed-tags-params-222.ipynb')))
+        assert normalize_nb(load_json(out_333))['cells'][1]['source'] == ['# Parameters\n', 'num = 333\n']
+        rows = [ line.split('\t') for line in check_output(['juq', 'nb', 'queue', 'ls', db]).decode().splitlines() ]
+        assert [ row[:3] for row in rows ] == [['1', 'done', '1/3'], ['2', 'done', '1/3'], ['3', 'failed', '2/2']]
+        assert rows[2][-1] == 'PapermillExecutionError: ValueError: error'
@@ -0,0 +1,96 @@
+import json
+from os.path import join
+from subprocess import PIPE, Popen, check_output
+
+import pytest
+
+from juq import api
+from juq.io import iter_nbs
+from tests.utils import MERGE_OUTPUTS_DIR, TEST_DIR, read_text
+
+NB_PATHS = [
+    join(TEST_DIR, 'mixed-tags.ipynb'),
+    join(TEST_DIR, 'test-renumber.ipynb'),
+    join(MERGE_OUTPUTS_DIR, 'split-outputs.ipynb'),
+]
+
+
+def test_stream_mixed():
+    """Pretty-printed (indent 1 and 0), and newline-delimited notebooks, in one stream."""
+    docs = [read_text(path) for path in NB_PATHS]
+    docs.append(api.fmt(docs[0], indent=0))
+    docs += [json.dumps(json.loads(doc)) + '\n' for doc in docs[:3]]
+    out = check_output(['juq', 'renumber', '-q', '--stream'], input=''.join(docs).encode()).decode()
+    assert out == ''.join(api.renumber(doc) for doc in docs)
+
+
+def test_stream_pipelined():
+    """Each notebook is emitted as soon as it's been read, without waiting for EOF."""
+    proc = Popen(['juq', 'merge-outputs', '--stream'], stdin=PIPE, stdout=PIPE, text=True)
+    try:
+        for path in NB_PATHS:
+            nb_line = json.dumps(json.loads(read_text(path))) + '\n'
+            proc.stdin.write(nb_line)
+            proc.stdin.flush()
+            assert proc.stdout.readline() == api.merge_outputs(nb_line)
+    finally:
+        proc.stdin.close()
+        proc.wait()
+    assert proc.returncode == 0
+
+
+def test_stream_cells():
+    docs = [read_text(path) for path in NB_PATHS]
+    out = check_output(['juq', 'cells', '--stream', '-s', '0'], input=''.join(docs).encode()).decode()
+    assert out == ''.join(api.cells(doc, '0', source=True) for doc in docs)
+
+
+def test_stream_opt():
+    """--stream is only offered by commands that transform notebook contents."""
+    for cmd in [['nb', 'clean'], ['nb', 'fmt'], ['merge-outputs'], ['renumber'], ['cells']]:
+        assert '--stream' in check_output(['juq', *cmd, '--help']).decode(), cmd
+    for cmd in [['nb', 'run'], ['papermill', 'run']]:
+        assert '--stream' not in check_output(['juq', *cmd, '--help']).decode(), cmd
+
+
+def test_iter_nbs_parses_once(monkeypatch, tmp_path):
+    """Each document is parsed once (not re-parsed at every candidate line), incl. indent-0 documents, several documents
+    on one line, and strings containing brackets."""
+    from juq import io
+    nb = json.loads(read_text(NB_PATHS[0]))
+    nb['metadata']['weird'] = '}\n{ "[" ]'
+    docs = [
+        json.dumps(nb, indent=0) + '\n',
+        json.dumps(nb, indent=2) + '\n\n',
+        json.dumps(nb) + ' ' + json.dumps(nb) + '\n',
+    ]
+    path = tmp_path / 'stream.txt'
+    path.write_text(''.join(docs))
+    loads = json.loads
+    calls = []
+
+    def counting_loads(s, *args, **kwargs):
+        calls.append(s)
+        return loads(s, *args, **kwargs)
+
+    monkeypatch.setattr(io.json, 'loads', counting_loads)
+    parsed = list(io.iter_nbs(str(path)))
+    assert [ p[0] for p in parsed ] == [nb] * 4
+    assert [ p[2].endswith('\n') for p in parsed ] == [True, True, False, True]
+    assert len(calls) == 4
+
+
+@pytest.mark.parametrize('stream', [
+    '{nb}\n5\n',
+    '[]\n',
+    '5\n{nb}\n',
+    '{nb},{nb}\n',
+    '{nb}\n}}\n',
+    '{nb}\n{{"cells": [\n',
+])
+def test_iter_nbs_invalid(stream, tmp_path):
+    """Non-object documents, stray text between documents, and incomplete documents raise ValueError."""
+    path = tmp_path / 'stream.txt'
+    path.write_text(stream.format(nb=json.dumps(json.loads(read_text(NB_PATHS[0])))))
+    with pytest.raises(ValueError):
+        list(iter_nbs(str(path)))
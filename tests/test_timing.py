@@ -0,0 +1,50 @@
+import pstats
+from os import environ
+from os.path import exists, join
+from subprocess import run
+from tempfile import TemporaryDirectory
+
+from juq import timing
+from tests.utils import TEST_DIR
+
+NB_PATH = join(TEST_DIR, 'mixed-tags.ipynb')
+
+
+def test_timings_flag():
+    proc = run(['juq', '--timings', 'nb', 'fmt', '-O', NB_PATH], capture_output=True, text=True, check=True)
+    [line] = proc.stderr.splitlines()
+    assert line.startswith(f'juq nb fmt -O {NB_PATH}: import ')
+    for name in ['read', 'parse', 'transform', 'serialize', 'write', 'total', 'peak RSS']:
+        assert f' {name} ' in line
+
+
+def test_timings_jobs():
+    """With -j, worker processes' parse/transform/serialize time is reported as "parallel"."""
+    proc = run(['juq', '--timings', 'nb', 'clean', '-j', '2', NB_PATH], capture_output=True, text=True, check=True)
+    [line] = proc.stderr.splitlines()
+    assert ' parallel ' in line
+    assert ' transform ' not in line and ' serialize ' not in line
+
+
+def test_profile_env():
+    with TemporaryDirectory() as tmpdir:
+        prof_path = join(tmpdir, 'juq.prof')
+        out_path = join(tmpdir, 'out.ipynb')
+        env = {**environ, 'JUQ_PROFILE': prof_path}
+        proc = run(['juq', 'renumber', '-q', NB_PATH, out_path], env=env, capture_output=True, text=True, check=True)
+        assert proc.stderr == ''
+        assert exists(out_path)
+        stats = pstats.Stats(prof_path)
+        assert any(fn == 'renumber' for _, _, fn in stats.stats)
+
+
+def test_nested_phases():
+    timing.enable()
+    try:
+        with timing.phase('transform'):
+            with timing.phase('read'):
+                pass
+        assert timing.timings['transform'] >= 0
+        assert set(timing.timings) == {'import', 'transform', 'read'}
+    finally:
+        timing.enabled = False
@@ -0,0 +1,82 @@
+import json
+import os
+from glob import glob
+from os.path import exists, join
+from subprocess import run
+from tempfile import TemporaryDirectory
+
+import pytest
+
+from juq.validate import ValidationError, validate_nb
+from tests.utils import MERGE_OUTPUTS_DIR, TEST_DIR, load_json
+
+NB_PATHS = sorted(glob(join(TEST_DIR, '*.ipynb')) + glob(join(MERGE_OUTPUTS_DIR, '*.ipynb')))
+
+
+def invalid_nbs():
+    nb = load_json(join(TEST_DIR, 'mixed-tags.ipynb'))
+    bad_source = json.loads(json.dumps(nb))
+    bad_source['cells'][0]['source'] = 3
+    bad_output = json.loads(json.dumps(nb))
+    bad_output['cells'][1]['outputs'] = [{'output_type': 'stream', 'text': 'missing "name"'}]
+    dup_ids = json.loads(json.dumps(nb))
+    dup_ids['cells'][1]['id'] = dup_ids['cells'][0]['id']
+    v3 = {**nb, 'nbformat': 3}
+    return [bad_source, bad_output, dup_ids, v3, [], 'nb']
+
+
+@pytest.mark.parametrize('path', NB_PATHS)
+def test_valid(path):
+    validate_nb(load_json(path))
+
+
+@pytest.mark.parametrize('nb', invalid_nbs())
+def test_invalid(nb):
+    with pytest.raises(ValidationError):
+        validate_nb(nb)
+
+
+@pytest.mark.parametrize('jobs', ['1', '2'])
+def test_validate_cmd(jobs):
+    with TemporaryDirectory() as tmpdir:
+        bad_paths = []
+        for idx, nb in enumerate(invalid_nbs()):
+            path = join(tmpdir, f'bad-{idx}.ipynb')
+            with open(path, 'w') as f:
+                json.dump(nb, f)
+            bad_paths.append(path)
+        with open(join(tmpdir, 'not-json.ipynb'), 'w') as f:
+            f.write('{')
+        bad_paths.append(join(tmpdir, 'not-json.ipynb'))
+
+        proc = run(['juq', 'validate', '-j', jobs, *NB_PATHS], capture_output=True, text=True)
+        assert proc.returncode == 0
+        assert proc.stderr == f'{len(NB_PATHS)} notebook(s) valid\n'
+
+        proc = run(['juq', 'validate', '-j', jobs, *NB_PATHS, *bad_paths], capture_output=True, text=True)
+        assert proc.returncode == 1
+        lines = proc.stderr.splitlines()
+        assert sorted(line.split(':')[0] for line in lines[:-1]) == bad_paths
+        assert lines[-1] == f'{len(bad_paths)} of {len(NB_PATHS) + len(bad_paths)} notebook(s) invalid'
+
+        proc = run(['juq', 'validate', '-j', jobs, '-x', *bad_paths], capture_output=True, text=True)
+        assert proc.returncode == 1
+        assert len(proc.stderr.splitlines()) >= 1
+
+
+def test_validate_on_write():
+    """--validate fails before writing an invalid notebook."""
+    with TemporaryDirectory() as tmpdir:
+        in_path = join(tmpdir, 'in.ipynb')
+        out_path = join(tmpdir, 'out.ipynb')
+        with open(in_path, 'w') as f:
+            json.dump(invalid_nbs()[0], f)
+        proc = run(['juq', 'nb', 'fmt', '--validate', in_path, out_path], capture_output=True, text=True)
+        assert proc.returncode != 0
+        assert 'ValidationError' in proc.stderr
+        assert not exists(out_path)
+        proc = run(['juq', 'merge-outputs', in_path, out_path], capture_output=True, text=True, env={**os.environ, 'JUQ_VALIDATE': '1'})
+        assert proc.returncode != 0
+        assert not exists(out_path)
+        run(['juq', 'nb', 'fmt', '--validate', join(TEST_DIR, 'mixed-tags.ipynb'), out_path], check=True)
+        validate_nb(load_json(out_path))
@@ -0,0 +1,76 @@
+import os
+import shutil
+from os import makedirs
+from os.path import getmtime, join
+from queue import Queue
+from subprocess import DEVNULL, Popen
+from tempfile import TemporaryDirectory
+from threading import Thread
+from time import sleep, time
+
+import pytest
+
+from juq import api
+from juq.watch import watch_nbs
+from tests.utils import MERGE_OUTPUTS_DIR, read_text
+
+
+def wait_for(predicate, timeout=10):
+    start = time()
+    while not predicate():
+        if time() - start > timeout:
+            raise TimeoutError
+        sleep(.05)
+
+
+@pytest.mark.parametrize('poll', [False, True])
+def test_watch_nbs(poll):
+    with TemporaryDirectory() as tmpdir:
+        batches = Queue()
+
+        def watch():
+            for batch in watch_nbs(tmpdir, poll=poll, poll_interval=.1):
+                batches.put(sorted(batch))
+
+        Thread(target=watch, daemon=True).start()
+        sleep(.3)
+        sub = join(tmpdir, 'sub')
+        makedirs(sub)
+        sleep(.3)
+        nb_path = join(sub, 'a.ipynb')
+        # A burst of writes to one notebook (and a non-notebook) is reported once
+        for i in range(3):
+            with open(nb_path, 'w') as f:
+                f.write('{}' + ' ' * i)
+            with open(join(sub, 'a.txt'), 'w') as f:
+                f.write('a')
+        assert batches.get(timeout=10) == [nb_path]
+        # Editor-style save: write a temp file, rename it over the notebook
+        tmp_path = join(tmpdir, '.a.ipynb.tmp')
+        with open(tmp_path, 'w') as f:
+            f.write('{}   ')
+        os.replace(tmp_path, nb_path)
+        assert batches.get(timeout=10) == [nb_path]
+
+
+def test_watch_cli():
+    """Changed notebooks are rewritten in-place once; unchanged notebooks (incl. our own writes) aren't touched."""
+    with TemporaryDirectory() as tmpdir:
+        proc = Popen(['juq', 'merge-outputs', '--watch', tmpdir], stderr=DEVNULL)
+        try:
+            sleep(1)
+            split_path = join(tmpdir, 'split.ipynb')
+            merged_path = join(tmpdir, 'merged.ipynb')
+            shutil.copy(join(MERGE_OUTPUTS_DIR, 'merged-outputs.ipynb'), merged_path)
+            merged_mtime = getmtime(merged_path)
+            shutil.copy(join(MERGE_OUTPUTS_DIR, 'split-outputs.ipynb'), split_path)
+            expected = api.merge_outputs(read_text(split_path))
+            wait_for(lambda: read_text(split_path) == expected)
+            split_mtime = getmtime(split_path)
+            sleep(1)
+            assert getmtime(split_path) == split_mtime
+            assert getmtime(merged_path) == merged_mtime
+            assert proc.poll() is None
+        finally:
+            proc.terminate()
+            proc.wait()
@@ -1,3 +1,4 @@
+import json
 import re
 import sys
 from copy import deepcopy
@@ -12,6 +13,21 @@ PYTHON_VERSION = ".".join(map(str, sys.version_info[:3]))
 ANSI_ESCAPE = re.compile(r'\x1b\[[0-9;]*m')
 
 
+def read_text(path):
+    with open(path, 'r') as f:
+        return f.read()
+
+
+def read_bytes(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def load_json(path):
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
 def strip_ansi(s):
     """Strip ANSI escape codes from a string."""
     return ANSI_ESCAPE.sub('', s)